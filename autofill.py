@@ -0,0 +1,390 @@
+from matrix import Matrix
+from slots import Slot, Position, find_slots
+from word_filter import WordIndex
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import Enum
+import math, os, pathlib, random, sys, time
+
+WILDCARD = "\0"
+
+class FillStatus(Enum):
+    SOLVED    = 1
+    EXHAUSTED = 2 # No fill exists with the given words
+    BUDGET    = 3 # Ran out of nodes or time
+    CANCELLED = 4
+
+@dataclass
+class FillBudget:
+    max_nodes: int | None = None
+    time_limit: float | None = None # Seconds
+
+@dataclass
+class FillProgress:
+    nodes: int
+    assigned: int
+    total: int
+    elapsed: float
+
+@dataclass
+class FillResult:
+    status: FillStatus
+    slots: list[Slot]
+    words: dict[int, str] = field(default_factory = dict) # Slot index to word
+    nodes: int = 0
+    elapsed: float = 0
+    
+    def apply(self, matrix: Matrix):
+        for index, word in self.words.items():
+            offset = 0
+            for cell in self.slots[index].cells:
+                square = matrix[*cell]
+                if is_empty(square.character):
+                    square.character = word[offset]
+                    offset += 1
+                else:
+                    offset += len(square.character)
+
+class FillInterrupted(Exception):
+    def __init__(self, status: FillStatus):
+        self.status = status
+
+def is_empty(character: str) -> bool:
+    return character == "" or character.isspace()
+
+@dataclass
+class Variable:
+    slot: Slot
+    length: int = 0 # Letters, counting every letter of a rebus square
+    fixed: dict[int, str] = field(default_factory = dict) # Letter offset to placed letter
+    crossings: list[tuple[int, int, int]] = field(default_factory = list) # (offset, other variable, other offset)
+    
+    def pattern(self) -> str:
+        return "".join(self.fixed.get(offset, WILDCARD) for offset in range(self.length))
+    
+    def complete(self) -> bool:
+        return len(self.fixed) == self.length
+
+def create_variables(matrix: Matrix, slots: list[Slot]) -> list[Variable]:
+    variables = []
+    owners: dict[Position, list[tuple[int, int]]] = {}
+    
+    for index, slot in enumerate(slots):
+        variable = Variable(slot)
+        for cell in slot.cells:
+            character = matrix[*cell].character
+            if is_empty(character):
+                owners.setdefault(cell, []).append((index, variable.length))
+                variable.length += 1
+            else:
+                # Placed letters and rebus squares are fixed, so they never link two variables.
+                for letter in character:
+                    variable.fixed[variable.length] = letter
+                    variable.length += 1
+        variables.append(variable)
+    
+    for shared in owners.values():
+        if len(shared) != 2: continue
+        (first, first_offset), (second, second_offset) = shared
+        variables[first].crossings.append((first_offset, second, second_offset))
+        variables[second].crossings.append((second_offset, first, first_offset))
+    
+    return variables
+
+class Autofill:
+    def __init__(self,
+                 matrix: Matrix,
+                 index: WordIndex,
+                 budget: FillBudget | None = None,
+                 progress: Callable[[FillProgress], None] | None = None,
+                 progress_interval: int = 500,
+                 seed: int | None = None,
+                 cancelled: Callable[[], bool] | None = None,
+                 ):
+        self.matrix = matrix
+        self.index = index
+        self.budget = FillBudget() if budget is None else budget
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.random = random.Random(seed) if seed is not None else None
+        self.cancelled = cancelled
+        
+        self.slots = find_slots(matrix)
+        self.variables = create_variables(matrix, self.slots)
+        # Entries already lettered in keep their text whether or not the dictionary has it. They have no
+        # open squares, so nothing crosses them and their only word never needs a posting.
+        self.complete_words = {variable: [self.variables[variable].pattern()] for variable in range(len(self.variables)) if self.variables[variable].complete()}
+        self.domains: list[set[int]] = []
+        self.assignment: dict[int, int] = {}
+        self.used: dict[str, int] = {} # Word to the variable holding it
+        self.pruned_by: list[list[int]] = [[] for _ in self.variables]
+        self.trail: list[list[tuple[int, set[int]]]] = []
+        
+        self.nodes = 0
+        self.start_time = 0
+    
+    def words(self, variable: int) -> list[str]:
+        if variable in self.complete_words:
+            return self.complete_words[variable]
+        return self.index.bucket(self.variables[variable].length)
+    
+    def initial_domain(self, variable: Variable) -> set[int]:
+        if variable.complete():
+            return {0}
+        matches = self.index.matching_indices(variable.pattern(), WILDCARD)
+        return set(range(len(self.index.bucket(variable.length)))) if matches is None else set(matches)
+    
+    def make_arc_consistent(self) -> bool:
+        queue = [(variable, crossing) for variable in range(len(self.variables)) for crossing in self.variables[variable].crossings]
+        queued = set(queue)
+        
+        while queue:
+            arc = queue.pop()
+            queued.discard(arc)
+            variable, (offset, other, other_offset) = arc
+            
+            words, other_words = self.words(variable), self.words(other)
+            supported = {other_words[word][other_offset] for word in self.domains[other]}
+            revised = {word for word in self.domains[variable] if words[word][offset] in supported}
+            
+            if len(revised) == len(self.domains[variable]):
+                continue
+            if not revised:
+                return False
+            
+            self.domains[variable] = revised
+            for crossing in self.variables[variable].crossings:
+                neighbour_arc = (crossing[1], (crossing[2], variable, crossing[0]))
+                if crossing[1] != other and neighbour_arc not in queued:
+                    queue.append(neighbour_arc)
+                    queued.add(neighbour_arc)
+        
+        return True
+    
+    def tick(self):
+        self.nodes += 1
+        elapsed = time.perf_counter() - self.start_time
+        
+        if self.cancelled is not None and self.cancelled():
+            raise FillInterrupted(FillStatus.CANCELLED)
+        if self.budget.max_nodes is not None and self.nodes > self.budget.max_nodes:
+            raise FillInterrupted(FillStatus.BUDGET)
+        if self.budget.time_limit is not None and elapsed > self.budget.time_limit:
+            raise FillInterrupted(FillStatus.BUDGET)
+        
+        if self.progress is not None and self.nodes % self.progress_interval == 0:
+            self.progress(FillProgress(self.nodes, len(self.assignment), len(self.variables), elapsed))
+    
+    def select_variable(self) -> int | None:
+        # Most constrained slot first, breaking ties by how many open slots it crosses.
+        best, best_key = None, None
+        for variable in range(len(self.variables)):
+            if variable in self.assignment: continue
+            
+            open_crossings = sum(1 for _, other, _ in self.variables[variable].crossings if other not in self.assignment)
+            key = (len(self.domains[variable]), -open_crossings, self.random.random() if self.random else 0)
+            if best_key is None or key < best_key:
+                best, best_key = variable, key
+        
+        return best
+    
+    def order_values(self, variable: int, conflicts: set[int]) -> list[int]:
+        # Prefer words that leave the crossing slots the most options, and drop those that leave none.
+        words = self.words(variable)
+        counts = []
+        
+        for offset, other, other_offset in self.variables[variable].crossings:
+            if other in self.assignment: continue
+            
+            letters = {words[word][offset] for word in self.domains[variable]}
+            length = self.variables[other].length
+            letter_counts = {letter: len(self.domains[other] & self.index.posting(length, other_offset, letter)) for letter in letters}
+            
+            if 0 in letter_counts.values():
+                conflicts.update(self.pruned_by[other])
+            counts.append((offset, letter_counts))
+        
+        scored = []
+        for word in self.domains[variable]:
+            score = 0
+            for offset, letter_counts in counts:
+                count = letter_counts[words[word][offset]]
+                if count == 0:
+                    break
+                score += math.log(count)
+            else:
+                if self.random:
+                    score += self.random.random()
+                scored.append((-score, word))
+        
+        scored.sort()
+        return [word for _, word in scored]
+    
+    def forward_check(self, variable: int, word: str) -> int | None:
+        # Returns the variable whose domain was wiped out, if any.
+        record = []
+        self.trail.append(record)
+        
+        for offset, other, other_offset in self.variables[variable].crossings:
+            if other in self.assignment: continue
+            
+            domain = self.domains[other]
+            reduced = domain & self.index.posting(self.variables[other].length, other_offset, word[offset])
+            if len(reduced) == len(domain): continue
+            
+            record.append((other, domain))
+            self.domains[other] = reduced
+            self.pruned_by[other].append(variable)
+            
+            if not reduced:
+                return other
+        
+        return None
+    
+    def undo(self):
+        for other, domain in reversed(self.trail.pop()):
+            self.domains[other] = domain
+            self.pruned_by[other].pop()
+    
+    def search(self) -> set[int] | None:
+        # Forward checking with conflict-directed backjumping. Returns None once every slot is filled,
+        # otherwise the conflict set of assigned variables responsible for the failure.
+        variable = self.select_variable()
+        if variable is None:
+            return None
+        
+        self.tick()
+        conflicts = set()
+        
+        for word_id in self.order_values(variable, conflicts):
+            word = self.words(variable)[word_id]
+            if word in self.used:
+                conflicts.add(self.used[word])
+                continue
+            
+            self.assignment[variable] = word_id
+            self.used[word] = variable
+            wiped = self.forward_check(variable, word)
+            
+            if wiped is None:
+                result = self.search()
+                if result is None:
+                    return None
+            else:
+                result = set(self.pruned_by[wiped])
+            
+            self.undo()
+            del self.assignment[variable]
+            del self.used[word]
+            
+            if wiped is None and variable not in result:
+                return result # Nothing this slot could change would fix the failure, so jump past it
+            
+            conflicts |= result
+            conflicts.discard(variable)
+        
+        return conflicts | set(self.pruned_by[variable])
+    
+    def solve(self) -> FillResult:
+        self.start_time = time.perf_counter()
+        result = FillResult(FillStatus.EXHAUSTED, self.slots)
+        
+        self.domains = [self.initial_domain(variable) for variable in self.variables]
+        if all(self.domains) and self.make_arc_consistent():
+            recursion_limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(max(recursion_limit, 4 * len(self.variables) + 100))
+            try:
+                if self.search() is None:
+                    result.status = FillStatus.SOLVED
+                    result.words = {variable: self.words(variable)[word] for variable, word in self.assignment.items()}
+            except FillInterrupted as interruption:
+                result.status = interruption.status
+            finally:
+                sys.setrecursionlimit(recursion_limit)
+        
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - self.start_time
+        return result
+
+def autofill(matrix: Matrix, index: WordIndex, **options) -> FillResult:
+    result = Autofill(matrix, index, **options).solve()
+    if result.status == FillStatus.SOLVED:
+        result.apply(matrix)
+    return result
+
+# Set once per pool worker, so tasks only carry the grid and a seed.
+worker_index: WordIndex | None = None
+worker_stop = None
+worker_nodes = None # Shared with the parent, one running node count per task
+
+def start_worker(words: pathlib.Path | list[str], stop, nodes):
+    global worker_index, worker_stop, worker_nodes
+    from dictionary_cache import CompiledWordIndex
+    # Compiled dictionaries are memory mapped by each worker rather than pickled.
+    worker_index = CompiledWordIndex(words) if isinstance(words, pathlib.Path) else WordIndex(words)
+    worker_stop = stop
+    worker_nodes = nodes
+
+def fill_worker(matrix: Matrix, task: int, seed: int | None, budget: FillBudget) -> FillResult:
+    def publish(progress: FillProgress):
+        worker_nodes[task] = progress.nodes
+    
+    result = Autofill(matrix, worker_index, budget, publish, seed = seed, cancelled = worker_stop.is_set).solve()
+    worker_nodes[task] = result.nodes
+    return result
+
+def parallel_autofill(matrix: Matrix,
+                      index: WordIndex,
+                      budget: FillBudget | None = None,
+                      progress: Callable[[FillProgress], None] | None = None,
+                      workers: int | None = None,
+                      poll_interval: float = 0.1,
+                      cancelled: Callable[[], bool] | None = None,
+                      ) -> FillResult:
+    # Runs a portfolio of searches with different random orderings, one per worker, and keeps
+    # the first to finish. Any worker proving there is no fill ends the search as well.
+    # The process pool is only imported here, so the editor does not pay for it at start up.
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from dictionary_cache import CompiledWordIndex
+    import multiprocessing
+    
+    workers = workers or os.cpu_count() or 1
+    budget = FillBudget() if budget is None else budget
+    words = index.path if isinstance(index, CompiledWordIndex) else [word for bucket in index.buckets.values() for word in bucket]
+    
+    # Spawned rather than forked: the editor calls this with other threads running, and a forked
+    # child could inherit a lock one of them holds.
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    running_nodes = context.Array("q", workers, lock = False) # Written by one task each, summed for progress
+    start_time = time.perf_counter()
+    result = FillResult(FillStatus.BUDGET, find_slots(matrix))
+    
+    with ProcessPoolExecutor(workers, mp_context = context, initializer = start_worker, initargs = (words, stop, running_nodes)) as executor:
+        # The first worker keeps the deterministic ordering.
+        pending = {executor.submit(fill_worker, matrix, seed, None if seed == 0 else seed, budget) for seed in range(workers)}
+        nodes = 0
+        
+        while pending:
+            done, pending = wait(pending, poll_interval, FIRST_COMPLETED)
+            
+            for future in done:
+                attempt = future.result()
+                nodes += attempt.nodes
+                if attempt.status in (FillStatus.SOLVED, FillStatus.EXHAUSTED) and not stop.is_set():
+                    result = attempt
+                    stop.set()
+            
+            if cancelled is not None and cancelled() and not stop.is_set():
+                result.status = FillStatus.CANCELLED
+                stop.set()
+            
+            if progress is not None:
+                progress(FillProgress(sum(running_nodes), len(result.words), len(result.slots), time.perf_counter() - start_time))
+    
+    result.nodes = nodes
+    result.elapsed = time.perf_counter() - start_time
+    if result.status == FillStatus.SOLVED:
+        result.apply(matrix)
+    return result
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os, sys, pathlib, argparse, json, time, traceback
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Exporters that draw with pygame never need a display
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+
+from editor import CrosswordEditor
+from exporter import Exporter, EXPORTERS_PATH, discover_exporters
+from document import load_document
+
+class HeadlessEditor(CrosswordEditor):
+    # Just enough of an editor for exporters to read a loaded document.
+    def __init__(self, path: pathlib.Path, export_settings: dict[str, object]):
+        document = load_document(path)
+        self.matrix = document.matrix
+        self.clues = document.clues
+        self.metadata = document.metadata
+        self.export_settings = export_settings
+
+@dataclass
+class ExportReport:
+    source: str
+    exporter: str
+    output: str
+    seconds: float
+    succeeded: bool
+    error: str = ""
+
+worker_exporters: dict[str, Exporter] = {}
+
+def start_worker(exporters_path: pathlib.Path):
+    global worker_exporters
+    worker_exporters = discover_exporters(exporters_path)
+
+def parse_settings(exporter: Exporter, settings: dict[str, str]) -> dict[str, object]:
+    parsed = {}
+    for key, value in settings.items():
+        if key not in exporter.settings: continue
+        kind = exporter.settings[key]
+        parsed[key] = value.lower() in ("1", "true", "yes") if kind is bool else kind(value)
+    return parsed
+
+def export_puzzle(source: pathlib.Path, exporter_names: list[str], output: pathlib.Path, settings: dict[str, str]) -> list[ExportReport]:
+    reports = []
+    name = str(pathlib.Path(output, source.stem))
+    
+    # Loaded once for every exporter; a puzzle that fails to load fails each of them with the same error.
+    start = time.perf_counter()
+    try:
+        editor, load_error = HeadlessEditor(source, {}), ""
+    except Exception:
+        editor, load_error = None, traceback.format_exc()
+    load_seconds = time.perf_counter() - start
+    
+    for exporter_name in exporter_names:
+        if editor is None:
+            reports.append(ExportReport(str(source), exporter_name, name, load_seconds, False, load_error))
+            continue
+        
+        exporter = worker_exporters[exporter_name]
+        start = time.perf_counter()
+        try:
+            editor.export_settings = parse_settings(exporter, settings)
+            succeeded, error = bool(exporter.export(editor, name)), ""
+        except Exception:
+            succeeded, error = False, traceback.format_exc()
+        reports.append(ExportReport(str(source), exporter_name, name, time.perf_counter() - start, succeeded, error))
+    
+    return reports
+
+def batch_export(sources: list[pathlib.Path],
+                 exporter_names: list[str],
+                 output: pathlib.Path,
+                 settings: dict[str, str] | None = None,
+                 workers: int | None = None,
+                 report_path: pathlib.Path | None = None,
+                 exporters_path: pathlib.Path | None = None,
+                 ) -> list[ExportReport]:
+    exporters_path = exporters_path or EXPORTERS_PATH
+    output.mkdir(parents = True, exist_ok = True)
+    
+    reports = []
+    report_file = open(report_path, "w", encoding = "utf-8") if report_path else None
+    
+    with ProcessPoolExecutor(workers, initializer = start_worker, initargs = (exporters_path,)) as executor:
+        # One puzzle per task; reports are written as each puzzle finishes.
+        futures = [executor.submit(export_puzzle, source, exporter_names, output, settings or {}) for source in sources]
+        
+        for future in as_completed(futures):
+            for report in future.result():
+                reports.append(report)
+                status = "ok" if report.succeeded else "FAILED"
+                print(f"{status:>6} {report.seconds * 1000:8.1f}ms  {report.exporter}: {report.source}")
+                if report.error:
+                    print(report.error, file = sys.stderr)
+                if report_file:
+                    report_file.write(json.dumps(asdict(report)) + "\n")
+                    report_file.flush()
+    
+    if report_file:
+        report_file.close()
+    
+    return reports
+
+def main(arguments: list[str]) -> int:
+    parser = argparse.ArgumentParser(description = "Export crossword documents without opening the editor.")
+    parser.add_argument("sources", nargs = "+", type = pathlib.Path, help = "Crossword documents (.cwd) to export")
+    parser.add_argument("-e", "--exporter", action = "append", dest = "exporters", help = "Exporter to run (default: all)")
+    parser.add_argument("-o", "--output", type = pathlib.Path, default = pathlib.Path("exports"))
+    parser.add_argument("-s", "--set", action = "append", default = [], metavar = "KEY=VALUE", help = "Exporter setting")
+    parser.add_argument("-j", "--workers", type = int, default = None)
+    parser.add_argument("--report", type = pathlib.Path, help = "Write one JSON line per export to this file")
+    parser.add_argument("--list", action = "store_true", help = "List the available exporters and exit")
+    options = parser.parse_args(arguments)
+    
+    available = discover_exporters()
+    if options.list:
+        for name, exporter in available.items():
+            print(f"{name}: {exporter.exports}")
+        return 0
+    
+    exporter_names = options.exporters or list(available)
+    unknown = [name for name in exporter_names if name not in available]
+    if unknown:
+        parser.error(f"unknown exporter(s): {', '.join(unknown)}")
+    
+    settings = dict(setting.split("=", 1) for setting in options.set)
+    
+    start = time.perf_counter()
+    reports = batch_export(options.sources, exporter_names, options.output, settings, options.workers, options.report)
+    failures = sum(not report.succeeded for report in reports)
+    
+    print(f"{len(reports) - failures}/{len(reports)} exports succeeded in {time.perf_counter() - start:.2f}s")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
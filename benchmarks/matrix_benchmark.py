@@ -0,0 +1,40 @@
+import os, sys, pathlib, time, tracemalloc
+sys.path.insert(0, str(pathlib.Path(os.path.dirname(os.path.abspath(__file__))).parent))
+
+from matrix import Matrix, CompactMatrix
+
+def measure_memory(create) -> tuple[object, int]:
+    tracemalloc.start()
+    created = create()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return created, size
+
+def measure_time(function, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+def main(sizes = (15, 21, 50, 100, 200)):
+    print(f"{'grid':>9} {'backend':>13} {'memory':>10} {'create':>10} {'copy':>10} {'copy+write':>11}")
+    
+    for size in sizes:
+        repeats = max(1, 2000 // size)
+        
+        for backend in (Matrix, CompactMatrix):
+            grid, memory = measure_memory(lambda: backend(size, size))
+            grid[0, 0].character = "A"
+            
+            create_time = measure_time(lambda: backend(size, size), repeats)
+            copy_time = measure_time(grid.deep_copy, repeats)
+            
+            def copy_and_write():
+                grid.deep_copy()[size // 2, size // 2].filled = True
+            write_time = measure_time(copy_and_write, repeats)
+            
+            print(f"{size:>4}x{size:<4} {backend.__name__:>13} {memory / 1024:>8.1f}KB "
+                  f"{create_time * 1000:>8.3f}ms {copy_time * 1000:>8.3f}ms {write_time * 1000:>9.3f}ms")
+
+if __name__ == "__main__":
+    main(tuple(int(argument) for argument in sys.argv[1:]) or (15, 21, 50, 100, 200))
\ No newline at end of file
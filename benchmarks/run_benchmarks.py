@@ -0,0 +1,381 @@
+import os, sys, pathlib, argparse, json, platform, random, shutil, statistics, string, subprocess, tempfile, time
+sys.path.insert(0, str(pathlib.Path(os.path.dirname(os.path.abspath(__file__))).parent))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from collections.abc import Callable
+from dataclasses import dataclass, asdict
+
+from word_filter import WordStore, create_filter
+from dawg import DawgStore
+from word_filter_benchmark import synthetic_dictionary, synthetic_patterns
+from matrix import Matrix, CompactMatrix
+from slots import Direction, SlotIndex
+from viability import CrossingChecker, crossing_query
+from pattern_query import parse_query, ranked_query
+from grid_health import GridHealth, analyze
+from editor import EditorModes
+
+import pygame
+
+GRID_SIZES = (5, 15, 21, 50)
+DICTIONARY_SIZES = (10_000, 100_000, 500_000)
+DENSITIES = (0.1, 0.3, 0.6)
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    median: float # Seconds per call
+    minimum: float
+    calls: int
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: float
+    current: float
+    
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+def measure(name: str, function: Callable[[], object], rounds: int = 7, round_time: float = 0.05) -> BenchmarkResult:
+    # Calls per round are calibrated so each round takes about `round_time`, then the median round is kept.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= round_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(round_time / elapsed) + 1))
+    
+    timings = [elapsed / number]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    
+    return BenchmarkResult(name, statistics.median(timings), min(timings), number * rounds)
+
+def filter_benchmarks(dictionary_sizes: tuple[int, ...], query_count: int = 20) -> list[BenchmarkResult]:
+    results = []
+    
+    for size in dictionary_sizes:
+        dictionaries = {"synthetic": synthetic_dictionary(size)}
+        results.append(measure(f"filter/build/{size}", lambda: create_filter(dictionaries), rounds = 3, round_time = 0))
+        
+        find_all_words = create_filter(dictionaries)
+        for density in DENSITIES:
+            patterns = synthetic_patterns(query_count, density)
+            
+            def cold_query():
+                find_all_words.cache.clear()
+                for pattern in patterns:
+                    find_all_words(pattern, " ")
+            
+            def cached_query():
+                for pattern in patterns:
+                    find_all_words(pattern, " ")
+            
+            for kind, query in (("cold", cold_query), ("cached", cached_query)):
+                result = measure(f"filter/query/{kind}/{size}/{density}", query)
+                result.median /= query_count
+                result.minimum /= query_count
+                results.append(result)
+    
+    return results
+
+def dawg_benchmarks(dictionary_sizes: tuple[int, ...], query_count: int = 20) -> list[BenchmarkResult]:
+    results = []
+    
+    for size in dictionary_sizes:
+        dictionaries = {"synthetic": synthetic_dictionary(size)}
+        results.append(measure(f"dawg/build/{size}", lambda: DawgStore(dictionaries), rounds = 3, round_time = 0))
+        
+        store = DawgStore(dictionaries)
+        for density in DENSITIES:
+            patterns = synthetic_patterns(query_count, density)
+            
+            def query():
+                for pattern in patterns:
+                    store.matching_indices(pattern, " ")
+            
+            result = measure(f"dawg/query/{size}/{density}", query)
+            result.median /= query_count
+            result.minimum /= query_count
+            results.append(result)
+        
+        results.append(measure(f"dawg/prefixed/{size}", lambda: store.prefixed("AB")))
+    
+    return results
+
+# Letter classes, sets, exclusions, required letters and a rebus square, in the pattern_query language.
+QUERIES = {
+    "classes": "@#@#@#@",
+    "set": "[AEIOU]??[^AEIOU]??",
+    "exclusions": "??????? -AEIOU",
+    "contains": "??????? +QZ",
+    "rebus": "?(ING|ED|S)??",
+}
+
+def query_benchmarks(dictionary_sizes: tuple[int, ...]) -> list[BenchmarkResult]:
+    results = []
+    
+    for size in dictionary_sizes:
+        store = WordStore({"synthetic": synthetic_dictionary(size)})
+        for name, text in QUERIES.items():
+            query = parse_query(text)
+            results.append(measure(f"query/{name}/{size}", lambda: ranked_query(store, query).top(20)))
+    
+    return results
+
+def viability_benchmarks(dictionary_sizes: tuple[int, ...], size: int = 15) -> list[BenchmarkResult]:
+    results = []
+    
+    grid = Matrix(size, size)
+    for row, column in ((0, 4), (1, 4), (4, 0), (4, 1), (size // 2, size // 2)):
+        grid[row, column].filled = grid[size - row - 1, size - column - 1].filled = True
+    slots = SlotIndex(grid)
+    slot = slots.slot_at((size // 2, 0), Direction.ACROSS)
+    
+    for dictionary_size in dictionary_sizes:
+        checker = CrossingChecker(WordStore({"synthetic": synthetic_dictionary(dictionary_size)}))
+        
+        for density in DENSITIES:
+            # Letters are placed at random, as in the pattern benchmarks.
+            rng = random.Random(density)
+            for row in range(size):
+                for column in range(size):
+                    grid[row, column].character = rng.choice(string.ascii_uppercase) if rng.random() < density else " "
+            query = crossing_query(grid, slots, slot)
+            
+            def cold():
+                checker.cache.clear()
+                checker.candidates(query).page(0, 64)
+            
+            results.append(measure(f"viability/cold/{dictionary_size}/{density}", cold))
+            results.append(measure(f"viability/cached/{dictionary_size}/{density}", lambda: checker.candidates(query).page(0, 64)))
+    
+    return results
+
+def matrix_benchmarks(grid_sizes: tuple[int, ...]) -> list[BenchmarkResult]:
+    results = []
+    
+    for size in grid_sizes:
+        for backend in (Matrix, CompactMatrix):
+            grid = backend(size, size)
+            grid[0, 0].character = "A"
+            results.append(measure(f"matrix/create/{backend.__name__}/{size}", lambda: backend(size, size)))
+            results.append(measure(f"matrix/deep_copy/{backend.__name__}/{size}", grid.deep_copy))
+    
+    return results
+
+def health_benchmarks(grid_sizes: tuple[int, ...]) -> list[BenchmarkResult]:
+    results = []
+    
+    for size in grid_sizes:
+        grid = Matrix(size, size)
+        slots = SlotIndex(grid)
+        health = GridHealth(grid, slots)
+        position = (size // 2, size // 2)
+        
+        def toggle():
+            # Filling the centre and clearing it again, as when laying out blocks.
+            for _ in range(2):
+                grid[*position].filled = not grid[*position].filled
+                slots.update(position)
+                health.update(position)
+        
+        results.append(measure(f"health/toggle/{size}", toggle))
+        results.append(measure(f"health/analyze/{size}", lambda: analyze(grid)))
+    
+    return results
+
+def cursor_benchmarks(grid_sizes: tuple[int, ...]) -> list[BenchmarkResult]:
+    from gui.cursor import Cursor
+    results = []
+    
+    for size in grid_sizes:
+        grid = Matrix(size, size)
+        grid[size // 2, size - 1].filled = True
+        cursor = Cursor(edges = grid.dimensions)
+        
+        def shift():
+            # Runs along a row to the filled square at its end, then back to the open edge.
+            cursor.row, cursor.column = size // 2, 0
+            cursor.shift_until(1, lambda row, column: grid[row, column].filled)
+            cursor.shift_until(-1, lambda row, column: grid[row, column].filled)
+        
+        results.append(measure(f"cursor/shift_until/{size}", shift))
+    
+    return results
+
+def gui_benchmarks(grid_sizes: tuple[int, ...]) -> list[BenchmarkResult]:
+    from gui.pygame_gui import PygameGUI
+    from gui.crossword_square import RenderedMatrix
+    results = []
+    
+    with tempfile.TemporaryDirectory() as directory:
+        gui = PygameGUI({"synthetic": synthetic_dictionary(1000)}, pathlib.Path(directory, "benchmark.cwd"))
+        
+        try:
+            for size in grid_sizes:
+                gui.update_dimensions(size, size)
+                gui.cursor.row, gui.cursor.column = size // 2, size // 2
+                
+                for mode in (EditorModes.NORMAL, EditorModes.SELECT):
+                    gui.mode = mode
+                    results.append(measure(f"gui/highlight_overlay/{mode.name.lower()}/{size}", gui.highlight_overlay))
+                gui.mode = EditorModes.NORMAL
+                
+                def full_draw():
+                    RenderedMatrix(gui.matrix, gui.screen, gui.theme, gui.matrix_position).draw()
+                results.append(measure(f"gui/draw/full/{size}", full_draw))
+                
+                rendered = RenderedMatrix(gui.matrix, gui.screen, gui.theme, gui.matrix_position)
+                overlays = []
+                for column in (0, 1):
+                    gui.cursor.column = column
+                    overlays.append(gui.highlight_overlay())
+                
+                def cursor_draw():
+                    # A cursor step: the previous and new cursor squares change.
+                    rendered.overlay = overlays[0] if rendered.overlay is overlays[1] else overlays[1]
+                    rendered.draw()
+                results.append(measure(f"gui/draw/cursor_move/{size}", cursor_draw))
+                
+                preview = RenderedMatrix(gui.matrix, gui.screen, gui.theme, gui.matrix_position, preview = True, numbers = SlotIndex(gui.matrix).numbers)
+                results.append(measure(f"gui/draw/unchanged_preview/{size}", preview.draw))
+        finally:
+            gui.word_lookup.stop()
+            gui.autosaver.stop(save = False)
+            pygame.quit()
+    
+    return results
+
+# Opens the editor on a dictionary directory in a fresh interpreter, as start.py does, and prints
+# the seconds until the first frame is drawn and until the dictionaries are loaded.
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import sys, pathlib
+sys.path.insert(0, sys.argv[1])
+from dictionary_cache import load_in_background
+loader = load_in_background(pathlib.Path(sys.argv[2]))
+from gui.pygame_gui import PygameGUI
+gui = PygameGUI(loader, pathlib.Path(sys.argv[2], "benchmark.cwd"), started = started)
+gui.render_all()
+first_frame = time.perf_counter() - started
+loader.wait()
+print(first_frame, time.perf_counter() - started)
+gui.word_lookup.stop()
+gui.autosaver.stop(save = False)
+"""
+
+def startup_benchmarks(dictionary_sizes: tuple[int, ...], rounds: int = 3) -> list[BenchmarkResult]:
+    # Cold runs compile the dictionary cache first, warm runs map the one left by the run before.
+    root = str(pathlib.Path(os.path.dirname(os.path.abspath(__file__))).parent)
+    results = []
+    
+    for size in dictionary_sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            dictionaries = pathlib.Path(directory, "dictionaries")
+            dictionaries.mkdir()
+            with open(pathlib.Path(dictionaries, "synthetic.txt"), "w") as file:
+                file.write("\n".join(synthetic_dictionary(size)))
+            
+            for kind in ("cold", "warm"):
+                timings = []
+                for _ in range(rounds):
+                    if kind == "cold":
+                        shutil.rmtree(pathlib.Path(dictionaries, ".cache"), ignore_errors = True)
+                    output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, root, str(dictionaries)], capture_output = True, text = True, check = True).stdout
+                    timings.append(tuple(float(value) for value in output.split()[-2:]))
+                
+                for index, stage in enumerate(("first_frame", "loaded")):
+                    stage_timings = [timing[index] for timing in timings]
+                    results.append(BenchmarkResult(f"startup/{stage}/{kind}/{size}", statistics.median(stage_timings), min(stage_timings), rounds))
+    
+    return results
+
+SUITES = {
+    "filter": lambda options: filter_benchmarks(options.dictionary_sizes),
+    "dawg": lambda options: dawg_benchmarks(options.dictionary_sizes),
+    "query": lambda options: query_benchmarks(options.dictionary_sizes),
+    "viability": lambda options: viability_benchmarks(options.dictionary_sizes),
+    "matrix": lambda options: matrix_benchmarks(options.grid_sizes),
+    "health": lambda options: health_benchmarks(options.grid_sizes),
+    "cursor": lambda options: cursor_benchmarks(options.grid_sizes),
+    "gui": lambda options: gui_benchmarks(options.grid_sizes),
+    "startup": lambda options: startup_benchmarks(options.dictionary_sizes),
+}
+
+def run(suites: list[str], options) -> dict:
+    results = []
+    for suite in suites:
+        for result in SUITES[suite](options):
+            print(f"{result.name:<45} {result.median * 1000:>12.4f}ms  (min {result.minimum * 1000:.4f}ms, {result.calls} calls)")
+            results.append(result)
+    
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pygame": pygame.version.ver,
+        "results": [asdict(result) for result in results],
+    }
+
+def compare(baseline: dict, current: dict) -> list[Comparison]:
+    previous = {result["name"]: result["median"] for result in baseline["results"]}
+    return [Comparison(result["name"], previous[result["name"]], result["median"])
+            for result in current["results"] if result["name"] in previous]
+
+def report_comparisons(comparisons: list[Comparison], threshold: float) -> int:
+    regressions = 0
+    for comparison in comparisons:
+        if comparison.ratio > 1 + threshold:
+            status = "SLOWER"
+            regressions += 1
+        elif comparison.ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = ""
+        print(f"{comparison.name:<45} {comparison.baseline * 1000:>12.4f}ms -> {comparison.current * 1000:>12.4f}ms {comparison.ratio:>6.2f}x {status}")
+    
+    print(f"{regressions} regression(s) over {threshold:.0%} in {len(comparisons)} benchmarks")
+    return regressions
+
+def sizes(argument: str) -> tuple[int, ...]:
+    return tuple(int(size) for size in argument.split(","))
+
+def main(arguments: list[str]) -> int:
+    parser = argparse.ArgumentParser(description = "Time the filter, crossing checks, grid, rendering and cursor hot paths.")
+    parser.add_argument("suites", nargs = "*", metavar = "SUITE", help = f"Any of {', '.join(SUITES)} (default: all)")
+    parser.add_argument("-o", "--output", type = pathlib.Path, help = "Save results as JSON")
+    parser.add_argument("-c", "--compare", type = pathlib.Path, metavar = "BASELINE", help = "Compare against saved results and flag regressions")
+    parser.add_argument("-t", "--threshold", type = float, default = 0.15, help = "Slowdown counted as a regression (default: 0.15)")
+    parser.add_argument("--grid-sizes", type = sizes, default = GRID_SIZES, dest = "grid_sizes")
+    parser.add_argument("--dictionary-sizes", type = sizes, default = DICTIONARY_SIZES, dest = "dictionary_sizes")
+    options = parser.parse_args(arguments)
+    unknown = [suite for suite in options.suites if suite not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)}")
+    
+    current = run(options.suites or list(SUITES), options)
+    
+    if options.output:
+        with open(options.output, "w", encoding = "utf-8") as file:
+            json.dump(current, file, indent = 2)
+    
+    if options.compare:
+        with open(options.compare, encoding = "utf-8") as file:
+            baseline = json.load(file)
+        print()
+        return 1 if report_comparisons(compare(baseline, current), options.threshold) else 0
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
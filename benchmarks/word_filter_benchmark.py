@@ -0,0 +1,71 @@
+import os, sys, pathlib, random, string, time
+sys.path.insert(0, str(pathlib.Path(os.path.dirname(os.path.abspath(__file__))).parent))
+
+import regex as re
+from word_filter import create_filter
+
+def create_scan_filter(dictionaries: dict[str, list[str]]):
+    # The original implementation of word_filter.create_filter, kept as a baseline.
+    def find_all_words(pattern: str, replace_char: str = "*") -> dict[str, list[str]]:
+        all_results = {}
+        
+        for key in dictionaries:
+            matches = dictionaries[key]
+            matches = list(filter(lambda word: len(word) == len(pattern), matches))
+            matches = list(filter(lambda word: re.match(pattern.replace(replace_char, r"\w"), word), matches))
+            
+            all_results[key] = matches
+        
+        return all_results
+    
+    return find_all_words
+
+def synthetic_dictionary(size: int, seed: int = 0) -> list[str]:
+    generator = random.Random(seed)
+    return ["".join(generator.choices(string.ascii_uppercase, k = generator.randint(3, 15))) for _ in range(size)]
+
+def synthetic_patterns(count: int, density: float, seed: int = 1) -> list[str]:
+    generator = random.Random(seed)
+    patterns = []
+    
+    for _ in range(count):
+        length = generator.randint(3, 15)
+        patterns.append("".join(generator.choice(string.ascii_uppercase) if generator.random() < density else " " for _ in range(length)))
+    
+    return patterns
+
+def time_queries(find_all_words, patterns: list[str]) -> float:
+    start = time.perf_counter()
+    for pattern in patterns:
+        find_all_words(pattern, " ")
+    return (time.perf_counter() - start) / len(patterns)
+
+def main(size: int = 500_000, query_count: int = 20):
+    dictionaries = {"synthetic": synthetic_dictionary(size)}
+    
+    start = time.perf_counter()
+    indexed = create_filter(dictionaries)
+    build_time = time.perf_counter() - start
+    scan = create_scan_filter(dictionaries)
+    
+    print(f"{size} words, index built in {build_time * 1000:.1f} ms")
+    
+    for density in (0.1, 0.3, 0.6):
+        patterns = synthetic_patterns(query_count, density)
+        
+        for pattern in patterns:
+            # The index stores each word once, so repeated words only match once.
+            expected = {key: list(dict.fromkeys(words)) for key, words in scan(pattern, " ").items()}
+            assert indexed(pattern, " ") == expected, pattern
+        
+        # The check above filled the query cache, so the index is timed on the store directly
+        # and cache hits are reported on their own.
+        scan_time = time_queries(scan, patterns)
+        indexed_time = time_queries(indexed.store.find_grouped, patterns)
+        cached_time = time_queries(indexed, patterns)
+        print(f"density {density:.1f}: scan {scan_time * 1000:8.2f} ms/query, "
+              f"index {indexed_time * 1000:8.3f} ms/query ({scan_time / indexed_time:.0f}x), "
+              f"cached {cached_time * 1000:8.4f} ms/query")
+
+if __name__ == "__main__":
+    main(*[int(argument) for argument in sys.argv[1:]])
\ No newline at end of file
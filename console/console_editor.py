@@ -1,58 +1,166 @@
 from matrix import Matrix
-from word_filter import create_filter
+from word_filter import WordStore, RankedMatches, create_filter
 from editor import CrosswordEditor, EditorModes, clamp
+from slots import Direction, SlotIndex
+from gui.cursor import Cursor
+from console.terminal import Cell, Frame, DifferentialRenderer, Terminal, text_cells
 
 from typing import *
-from copy import deepcopy
-from enum import Enum
-import keyboard, os
+
+# SGR parameters for each kind of square.
+STYLES = {
+    "open": "",
+    "filled": "7",         # Reverse video
+    "highlight": "30;46",  # The entry under the cursor
+    "cursor": "30;43",
+}
 
 class ConsoleEditor(CrosswordEditor):
-    def __init__(self, dictionaries: Dict[str, list[str]]):
+    # Runs in a terminal over SSH: the grid is drawn with escape codes by a differential renderer,
+    # scrolled to follow the cursor on grids larger than the window, with word-filter results beside it.
+    def __init__(self, dictionaries: Dict[str, list[str]] | WordStore, rows: int | None = None, columns: int | None = None, pane_width: int = 40):
         self.find_all_words = create_filter(dictionaries)
-        self.matrix = Matrix(int(input("Rows? ")), int(input("Columns? ")))
-        self.cursor_pos = [0, 0]
-        self.going_down = False
+        self.matrix = Matrix(rows or int(input("Rows? ")), columns or int(input("Columns? ")))
+        self.cursor = Cursor(edges = self.matrix.dimensions)
+        self.slots = SlotIndex(self.matrix)
         self.mode = EditorModes.NORMAL
+        self.renderer = DifferentialRenderer()
+        self.pane_width = pane_width
+        self.origin = (0, 0) # Top left square in view
+        self.across_words: RankedMatches | None = None
+        self.down_words: RankedMatches | None = None
+        self.word_scroll = 0
+        self.running = True
     
     def main_loop(self):
-        self.display_matrix()
-        while True:
-            pressed = keyboard.read_event()
-            
-            if pressed.event_type != keyboard.KEY_DOWN: continue
-            
-            match pressed.name:
-                case "left":
-                    self.cursor_pos[1] -= 1
-                case "right":
-                    self.cursor_pos[1] += 1
-                case "up":
-                    self.cursor_pos[0] -= 1
-                case "down":
-                    self.cursor_pos[0] += 1
-                case "esc":
-                    break
-                case "tab":
-                    self.going_down = not self.going_down
-                case _:
-                    if len(pressed.name) == 1:
-                        self.matrix[*self.cursor_pos] = pressed.name.lower()
-                        if self.going_down:
-                            self.cursor_pos[0] += 1
-                        else:
-                            self.cursor_pos[1] += 1
-            
-            self.cursor_pos[0] = clamp(self.cursor_pos[0], 0, self.matrix.dimensions[0] - 1)
-            self.cursor_pos[1] = clamp(self.cursor_pos[1], 0, self.matrix.dimensions[1] - 1)
-            
-            self.display_matrix()
+        with Terminal() as terminal:
+            self.refresh_words()
+            while self.running:
+                size = terminal.size()
+                self.renderer.draw(self.compose(size), size)
+                self.handle_key(terminal.read_key())
+    
+    def handle_key(self, key: str):
+        square_not_filled = lambda row, column: not self.matrix[row, column].filled
+        position = self.cursor.position()
         
-    def display_matrix(self):
-        os.system("cls")
-        display = [deepcopy(row) for row in self.matrix.contents]
+        match key:
+            case "esc" | "eof":
+                self.running = False
+                return
+            case "left" | "right":
+                self.cursor.going_down = False
+                self.cursor.shift_until(-1 if key == "left" else 1, square_not_filled)
+            case "up" | "down":
+                self.cursor.going_down = True
+                self.cursor.shift_until(-1 if key == "up" else 1, square_not_filled)
+            case "tab":
+                self.cursor.going_down = not self.cursor.going_down
+            case "pageup":
+                self.word_scroll = max(self.word_scroll - 10, 0)
+                return
+            case "pagedown":
+                self.word_scroll += 10
+                return
+            case "backspace":
+                if self.matrix[*position].character.isspace():
+                    self.cursor.shift_if(-1, square_not_filled)
+                self.matrix[*self.cursor.position()].character = " "
+            case "delete":
+                self.matrix[*position].character = " "
+            case "#":
+                # Blocks are placed symmetrically, as in the editor's fill mode.
+                rows, columns = self.matrix.dimensions
+                for cell in {position, (rows - position[0] - 1, columns - position[1] - 1)}:
+                    self.matrix[*cell].filled = not self.matrix[*cell].filled
+                    self.slots.update(cell)
+            case _:
+                if len(key) == 1 and key.isalnum() and not self.matrix[*position].filled:
+                    self.matrix[*position].character = key
+                    self.cursor.shift_if(1, square_not_filled)
+                else:
+                    return
         
-        to_upper_char: str = display[self.cursor_pos[0]][self.cursor_pos[1]]
-        display[self.cursor_pos[0]][self.cursor_pos[1]] = "^" if not to_upper_char.isalnum() else to_upper_char.upper()
+        self.refresh_words()
+    
+    def refresh_words(self):
+        position = self.cursor.position()
+        self.word_scroll = 0
+        self.across_words = self.down_words = None
+        if self.matrix[*position].filled:
+            return
         
-        print("---\n" + "\n".join(["".join(row) for row in display]))
\ No newline at end of file
+        across, down = self.slots.slots_at(position)
+        for direction, slot in ((Direction.ACROSS, across), (Direction.DOWN, down)):
+            pattern = slot.pattern(self.matrix) if slot else ""
+            if len(pattern) < 3 or pattern.isspace():
+                continue
+            # Ranked lazily, so only the rows on screen are ever sorted.
+            words = self.find_all_words.ranked(pattern, " ")
+            if direction == Direction.ACROSS:
+                self.across_words = words
+            else:
+                self.down_words = words
+    
+    def follow(self, visible: tuple[int, int]):
+        # Scrolls just far enough to keep the cursor in view.
+        origin = []
+        for axis in (0, 1):
+            low = min(self.origin[axis], self.cursor.position()[axis])
+            low = max(low, self.cursor.position()[axis] - visible[axis] + 1)
+            origin.append(clamp(low, 0, max(self.matrix.dimensions[axis] - visible[axis], 0)))
+        self.origin = tuple(origin)
+    
+    def square_cell(self, row: int, column: int, highlighted: set[tuple[int, int]]) -> list[Cell]:
+        # Two columns per square, so squares come out roughly square.
+        square = self.matrix[row, column]
+        if square.filled:
+            return [(" ", STYLES["filled"])] * 2
+        
+        style = STYLES["cursor"] if (row, column) == self.cursor.position() else STYLES["highlight"] if (row, column) in highlighted else STYLES["open"]
+        character = square.character.upper()
+        if character.isspace() or not character:
+            return [("." if style == STYLES["open"] else " ", style), (" ", style)]
+        return [(character[0], style), ("+" if len(character) > 1 else " ", style)] # + marks a rebus square
+    
+    def compose(self, size: tuple[int, int]) -> Frame:
+        height, width = size
+        grid_width = max(width - self.pane_width - 1, 2)
+        visible = (min(self.matrix.dimensions[0], max(height - 1, 1)), min(self.matrix.dimensions[1], grid_width // 2))
+        self.follow(visible)
+        
+        direction = Direction.DOWN if self.cursor.going_down else Direction.ACROSS
+        slot = self.slots.slot_at(self.cursor.position(), direction)
+        highlighted = set(slot.cells) if slot is not None and not self.matrix[*self.cursor.position()].filled else set()
+        
+        frame: Frame = []
+        top, left = self.origin
+        for row in range(top, top + visible[0]):
+            cells = []
+            for column in range(left, left + visible[1]):
+                cells += self.square_cell(row, column, highlighted)
+            frame.append(cells + [(" ", "")] * (grid_width - len(cells) + 1))
+        while len(frame) < height - 1:
+            frame.append([(" ", "")] * (grid_width + 1))
+        
+        self.compose_words(frame, grid_width + 1, height - 1)
+        
+        row, column = self.cursor.position()
+        status = f" {row + 1},{column + 1} {'down' if self.cursor.going_down else 'across'}  {self.matrix.dimensions[0]}x{self.matrix.dimensions[1]}  # block  tab turn  pgup/pgdn words  esc quit"
+        frame.append(text_cells(status, STYLES["filled"], width))
+        return frame
+    
+    def compose_words(self, frame: Frame, left: int, height: int):
+        # Across and down candidates in two columns of the side pane.
+        column_width = self.pane_width // 2
+        for index, (title, candidates) in enumerate((("Across", self.across_words), ("Down", self.down_words))):
+            lines = [f"{title} ({len(candidates)})" if candidates else title]
+            if candidates:
+                self.word_scroll = min(self.word_scroll, max(len(candidates) - 1, 0))
+                lines += [word for word, _ in candidates.page(self.word_scroll, self.word_scroll + height - 1)]
+            
+            for row in range(height):
+                text = lines[row] if row < len(lines) else ""
+                frame[row] += text_cells(text, "1" if row == 0 else "", column_width - 1 if index == 0 else column_width)
+                if index == 0:
+                    frame[row].append((" ", ""))
\ No newline at end of file
@@ -0,0 +1,165 @@
+from collections.abc import Callable
+import os, sys, shutil
+
+# A character cell: the character and the SGR parameters it is drawn with ("" for plain text).
+Cell = tuple[str, str]
+Frame = list[list[Cell]]
+
+BLANK: Cell = (" ", "")
+
+ESCAPE_KEYS = {
+    "[A": "up", "[B": "down", "[C": "right", "[D": "left",
+    "[H": "home", "[F": "end", "[3~": "delete", "[5~": "pageup", "[6~": "pagedown",
+    "OA": "up", "OB": "down", "OC": "right", "OD": "left",
+}
+WINDOWS_KEYS = {"H": "up", "P": "down", "K": "left", "M": "right", "G": "home", "O": "end", "S": "delete", "I": "pageup", "Q": "pagedown"}
+CONTROL_KEYS = {"\t": "tab", "\r": "enter", "\n": "enter", "\x7f": "backspace", "\x08": "backspace", "\x1b": "esc"}
+
+def move_to(row: int, column: int) -> str:
+    return f"\x1b[{row + 1};{column + 1}H"
+
+def set_style(style: str) -> str:
+    return f"\x1b[0;{style}m" if style else "\x1b[0m"
+
+class DifferentialRenderer:
+    # Keeps what is on the screen and only writes the cells that differ from it, moving the cursor
+    # with escape codes instead of clearing. Runs of changed cells share one cursor move, and the
+    # style is only switched when it changes, so a keystroke costs a few bytes on a slow link.
+    def __init__(self, write: Callable[[str], object] | None = None, flush: Callable[[], object] | None = None):
+        self.write = sys.stdout.write if write is None else write
+        self.flush = sys.stdout.flush if flush is None else flush
+        self.screen: Frame = []
+        self.size: tuple[int, int] | None = None
+    
+    def invalidate(self):
+        # The next frame is drawn in full, e.g. after the terminal was resized.
+        self.size = None
+    
+    def render(self, frame: Frame, size: tuple[int, int]) -> str:
+        output = []
+        if size != self.size:
+            self.size = size
+            self.screen = []
+            output.append(set_style("") + "\x1b[2J")
+        
+        style = None
+        for row_index, row in enumerate(frame):
+            if row_index >= len(self.screen):
+                self.screen.append([])
+            drawn = self.screen[row_index]
+            at = None # Where the terminal cursor is after the last write on this row
+            
+            for column in range(max(len(row), len(drawn))):
+                cell = row[column] if column < len(row) else BLANK
+                if cell == (drawn[column] if column < len(drawn) else BLANK):
+                    continue
+                
+                if at != column:
+                    output.append(move_to(row_index, column))
+                if cell[1] != style:
+                    style = cell[1]
+                    output.append(set_style(style))
+                output.append(cell[0])
+                at = column + 1
+            
+            self.screen[row_index] = list(row)
+        
+        # Rows below the frame are cleared once, when the frame gets shorter.
+        for row_index in range(len(frame), len(self.screen)):
+            if self.screen[row_index]:
+                output.append(move_to(row_index, 0) + set_style("") + "\x1b[K")
+                style = ""
+        del self.screen[len(frame):]
+        
+        if style:
+            output.append(set_style(""))
+        return "".join(output)
+    
+    def draw(self, frame: Frame, size: tuple[int, int]) -> int:
+        output = self.render(frame, size)
+        if output:
+            self.write(output)
+            self.flush()
+        return len(output)
+
+def text_cells(text: str, style: str = "", width: int | None = None) -> list[Cell]:
+    if width is not None:
+        text = text[:width].ljust(width)
+    return [(character, style) for character in text]
+
+class Terminal:
+    # Raw key input and the alternate screen, on POSIX terminals and the Windows console.
+    def __init__(self):
+        self.saved = None
+    
+    def __enter__(self) -> "Terminal":
+        if os.name == "nt":
+            import ctypes
+            # Turns on escape code processing in the Windows console.
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.GetStdHandle(-11)
+            mode = ctypes.c_uint32()
+            kernel32.GetConsoleMode(handle, ctypes.byref(mode))
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+        else:
+            import termios, tty
+            self.saved = termios.tcgetattr(sys.stdin.fileno())
+            tty.setraw(sys.stdin.fileno())
+        
+        sys.stdout.write("\x1b[?1049h\x1b[?25l") # Alternate screen, hidden cursor
+        sys.stdout.flush()
+        return self
+    
+    def __exit__(self, *exception):
+        sys.stdout.write("\x1b[0m\x1b[?25h\x1b[?1049l")
+        sys.stdout.flush()
+        if self.saved is not None:
+            import termios
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, self.saved)
+    
+    def size(self) -> tuple[int, int]:
+        columns, rows = shutil.get_terminal_size()
+        return rows, columns
+    
+    def read_key(self) -> str:
+        # Printable keys come back as themselves, others by name ("up", "pagedown", "esc", ...),
+        # and "eof" once the input is closed.
+        if os.name == "nt":
+            import msvcrt
+            key = msvcrt.getwch()
+            if key in ("\x00", "\xe0"):
+                return WINDOWS_KEYS.get(msvcrt.getwch(), "")
+            return CONTROL_KEYS.get(key, key)
+        
+        import select
+        descriptor = sys.stdin.fileno()
+        key = self.read_character(descriptor)
+        if not key:
+            return "eof"
+        if key != "\x1b":
+            return CONTROL_KEYS.get(key, key)
+        
+        # A lone escape is the escape key; otherwise the rest of the sequence follows at once.
+        sequence = ""
+        while select.select([descriptor], [], [], 0.05)[0]:
+            character = self.read_character(descriptor)
+            if not character:
+                break
+            sequence += character
+            if len(sequence) > 1 and (sequence[-1].isalpha() or sequence[-1] == "~"):
+                break
+        return ESCAPE_KEYS.get(sequence, "esc" if not sequence else "")
+    
+    def read_character(self, descriptor: int) -> str:
+        # Empty at the end of the input.
+        data = os.read(descriptor, 1)
+        if not data:
+            return ""
+        # Multi-byte UTF-8 characters announce their length in the first byte.
+        length = 4 if data[0] >= 0xF0 else 3 if data[0] >= 0xE0 else 2 if data[0] >= 0xC0 else 1
+        while len(data) < length:
+            byte = os.read(descriptor, 1)
+            if not byte:
+                break
+            data += byte
+        return data.decode(errors = "replace")
\ No newline at end of file
@@ -0,0 +1,382 @@
+from word_filter import WordStore, NON_WORD, is_word_character, merge_dictionaries
+
+from array import array
+from collections.abc import Iterator, Sequence
+import bisect, json, mmap, os, pathlib, struct
+
+MAGIC = b"CWDG"
+VERSION = 1
+
+# Magic, version, metadata length, then node, edge and word counts. JSON metadata (source names,
+# bucket table and the letters at each position) follows, padded to a multiple of eight bytes.
+HEADER = struct.Struct("<4sIIIII")
+
+# What a traversal accepts at a position, besides the code point of one letter.
+ANY_WORD = -1     # A wildcard: anything a regex `\w` matches
+ANY = -2          # Any character
+ANY_NON_WORD = -3 # Anything NON_WORD marks
+
+LENGTH_BITS = 64
+
+def shift_lengths(mask: int) -> int:
+    # Every length one longer. Lengths from 63 up share the top bit, which only makes pruning looser.
+    shifted = mask << 1
+    if shifted >> LENGTH_BITS:
+        shifted = shifted & (1 << LENGTH_BITS) - 1 | 1 << LENGTH_BITS - 1
+    return shifted
+
+def length_bit(length: int) -> int:
+    return 1 << min(length, LENGTH_BITS - 1)
+
+def build_graph(words: list[str]) -> tuple[list[bool], list[tuple[tuple[int, int], ...]]]:
+    # The minimal acyclic automaton of sorted, distinct words, built incrementally (Daciuk et al.):
+    # once a word is added, the nodes only the previous word used are merged with equivalent ones.
+    finals = [False]
+    children: list = [[]] # Node to (code point, child) pairs in letter order, a tuple once registered
+    register: dict[tuple, int] = {}
+    path = [0]
+    
+    def minimise(depth: int):
+        while len(path) - 1 > depth:
+            node = path.pop()
+            key = (finals[node], tuple(children[node]))
+            existing = register.setdefault(key, node)
+            if existing == node:
+                children[node] = key[1]
+            else:
+                children[path[-1]][-1] = (children[path[-1]][-1][0], existing)
+                children[node] = None
+    
+    previous = ""
+    for word in words:
+        common = len(os.path.commonprefix((word, previous)))
+        minimise(common)
+        
+        node = path[-1]
+        for letter in word[common:]:
+            finals.append(False)
+            children.append([])
+            children[node].append((ord(letter), len(finals) - 1))
+            node = len(finals) - 1
+            path.append(node)
+        finals[node] = True
+        previous = word
+    
+    minimise(0)
+    children[0] = tuple(children[0])
+    return finals, children
+
+class DawgBucket(Sequence[str]):
+    # The words of one length in store order, spelled out of the graph as they are read.
+    def __init__(self, store: "DawgStore", start: int, count: int):
+        self.store = store
+        self.start = start
+        self.count = count
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.store.spell(self.store.bucket_ranks[self.start + index])
+
+class DawgStore(WordStore):
+    # A WordStore whose words are kept as a minimal word graph (a DAWG) in flat arrays instead of
+    # strings and postings, so it takes a fraction of the memory and can be memory mapped from a file.
+    # Patterns are answered by walking the graph, skipping letters the pattern rules out and nodes
+    # with no words of the right length below them. Words are numbered in sorted order by the walk,
+    # and that rank is mapped back to the word's place in its bucket, so results match WordStore.
+    def __init__(self, dictionaries: dict[str, Sequence[str]], scores: dict[str, Sequence[int]] | None = None):
+        self.names = list(dictionaries)
+        words, word_scores, word_masks = merge_dictionaries(dictionaries, scores)
+        
+        sorted_ids = sorted(range(len(words)), key = words.__getitem__)
+        finals, children = build_graph([words[word_id] for word_id in sorted_ids])
+        self.pack_graph(finals, children)
+        del finals, children
+        
+        ranks = array("I", bytes(4 * len(words)))
+        for rank, word_id in enumerate(sorted_ids):
+            ranks[word_id] = rank
+        del sorted_ids
+        
+        bucket_ids: dict[int, list[int]] = {}
+        for word_id, word in enumerate(words):
+            bucket_ids.setdefault(len(word), []).append(word_id)
+        
+        self.bucket_table = {}
+        self.bucket_ranks = array("I")
+        self.bucket_rankings = array("I")
+        self.word_scores = array("i")
+        self.word_masks = array("Q")
+        self.positions = array("I", bytes(4 * len(words))) # Rank to the word's index in its bucket
+        letters: dict[tuple[int, int], set[str]] = {}
+        
+        for length, ids in bucket_ids.items():
+            self.bucket_table[length] = (len(self.bucket_ranks), len(ids))
+            for index, word_id in enumerate(ids):
+                self.positions[ranks[word_id]] = index
+                for position, letter in enumerate(words[word_id]):
+                    letters.setdefault((length, position), set()).add(letter)
+            
+            self.bucket_ranks.extend(ranks[word_id] for word_id in ids)
+            self.word_scores.extend(word_scores[word_id] for word_id in ids)
+            self.word_masks.extend(word_masks[word_id] for word_id in ids)
+            # Stable, so equal scores keep the dictionary's order, as WordIndex.ranking does.
+            self.bucket_rankings.extend(sorted(range(len(ids)), key = lambda index: -word_scores[ids[index]]))
+        
+        self.letter_table = {key: sorted(found) for key, found in letters.items()}
+        self.finish()
+    
+    def pack_graph(self, finals: list[bool], children: list):
+        # Numbers the reachable nodes so every node comes before its children, then lays their edges
+        # out one node after another.
+        order = []
+        visited = {0}
+        stack = [(0, iter(children[0]))]
+        while stack:
+            node, edges = stack[-1]
+            for _, child in edges:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(children[child])))
+                    break
+            else:
+                order.append(node)
+                stack.pop()
+        
+        numbers = {node: number for number, node in enumerate(reversed(order))}
+        self.finals = bytearray(finals[node] for node in reversed(order))
+        self.lengths = array("Q", bytes(8 * len(order)))
+        self.first = array("I", [0])
+        self.labels, self.targets, self.offsets = array("I"), array("I"), array("I")
+        self.word_edges = bytearray()
+        counts = [0] * len(order)
+        
+        # Children are numbered after their parents, so going backwards sees every child first.
+        for number in range(len(order) - 1, -1, -1):
+            node = order[len(order) - 1 - number]
+            count, lengths = self.finals[number], self.finals[number]
+            for _, child in children[node]:
+                count += counts[numbers[child]]
+                lengths |= shift_lengths(self.lengths[numbers[child]])
+            counts[number] = count
+            self.lengths[number] = lengths
+        
+        for number, node in enumerate(reversed(order)):
+            offset = self.finals[number]
+            for label, child in children[node]:
+                self.labels.append(label)
+                self.targets.append(numbers[child])
+                self.offsets.append(offset)
+                self.word_edges.append(is_word_character(chr(label)))
+                offset += counts[numbers[child]]
+            self.first.append(len(self.labels))
+    
+    def finish(self):
+        self.buckets = {length: DawgBucket(self, start, count) for length, (start, count) in self.bucket_table.items()}
+        self.postings = {} # Filled in as autofill and the crossing checks ask for them
+        self.scores = {}
+        self.rankings = {}
+        self.masks = {}
+        # Lengths with words a wildcard can skip, so a pattern of only wildcards may not match all of them.
+        self.mixed_lengths = {length for length in self.buckets
+                              if not all(is_word_character(letter) for position in range(length) for letter in self.letters(length, position))}
+    
+    def spell(self, rank: int) -> str:
+        node, letters = 0, []
+        while not (self.finals[node] and rank == 0):
+            edge = bisect.bisect_right(self.offsets, rank, self.first[node], self.first[node + 1]) - 1
+            rank -= self.offsets[edge]
+            letters.append(chr(self.labels[edge]))
+            node = self.targets[edge]
+        return "".join(letters)
+    
+    def traverse(self, codes: list[int]) -> list[int]:
+        # Ranks of the words with len(codes) letters that every position's code accepts.
+        length = len(codes)
+        first, labels, targets, offsets, lengths, word_edges = self.first, self.labels, self.targets, self.offsets, self.lengths, self.word_edges
+        ranks = []
+        
+        stack = [(0, 0, 0)] if lengths[0] & length_bit(length) else []
+        while stack:
+            node, depth, rank = stack.pop()
+            if depth == length:
+                ranks.append(rank) # The length bits only let complete words get this far
+                continue
+            
+            code, bit = codes[depth], length_bit(length - depth - 1)
+            start, stop = first[node], first[node + 1]
+            if code >= 0:
+                edge = bisect.bisect_left(labels, code, start, stop)
+                if edge < stop and labels[edge] == code and lengths[targets[edge]] & bit:
+                    stack.append((targets[edge], depth + 1, rank + offsets[edge]))
+                continue
+            
+            for edge in range(start, stop):
+                if not lengths[targets[edge]] & bit:
+                    continue
+                if code == ANY or (code == ANY_WORD) == bool(word_edges[edge]):
+                    stack.append((targets[edge], depth + 1, rank + offsets[edge]))
+        
+        return ranks
+    
+    def bucket_scores(self, length: int) -> Sequence[int]:
+        start, count = self.bucket_table.get(length, (0, 0))
+        return memoryview(self.word_scores)[start:start + count]
+    
+    def bucket_masks(self, length: int) -> Sequence[int]:
+        start, count = self.bucket_table.get(length, (0, 0))
+        return memoryview(self.word_masks)[start:start + count]
+    
+    def ranking(self, length: int) -> Sequence[int]:
+        start, count = self.bucket_table.get(length, (0, 0))
+        return memoryview(self.bucket_rankings)[start:start + count]
+    
+    def posting(self, length: int, position: int, letter: str) -> set[int]:
+        key = (length, position, letter)
+        if key not in self.postings:
+            codes = [ANY] * length
+            codes[position] = ANY_NON_WORD if letter == NON_WORD else ord(letter)
+            self.postings[key] = {self.positions[rank] for rank in self.traverse(codes)}
+        return self.postings[key]
+    
+    def matching_indices(self, pattern: str, replace_char: str = "*") -> set[int] | None:
+        codes = [ANY_WORD if letter == replace_char else ord(letter) for letter in pattern]
+        if len(pattern) not in self.mixed_lengths and all(code == ANY_WORD for code in codes):
+            return None
+        return {self.positions[rank] for rank in self.traverse(codes)}
+    
+    def follow(self, node: int, text: str) -> int | None:
+        for letter in text:
+            start, stop = self.first[node], self.first[node + 1]
+            edge = bisect.bisect_left(self.labels, ord(letter), start, stop)
+            if edge == stop or self.labels[edge] != ord(letter):
+                return None
+            node = self.targets[edge]
+        return node
+    
+    def words_below(self, node: int, prefix: str = "") -> Iterator[str]:
+        # In sorted order.
+        stack = [(node, prefix)]
+        while stack:
+            node, word = stack.pop()
+            if self.finals[node]:
+                yield word
+            for edge in reversed(range(self.first[node], self.first[node + 1])):
+                stack.append((self.targets[edge], word + chr(self.labels[edge])))
+    
+    def prefixed(self, prefix: str) -> list[str]:
+        node = self.follow(0, prefix)
+        return [] if node is None else list(self.words_below(node, prefix))
+    
+    def suffixed(self, suffix: str) -> list[str]:
+        return self.search_text(suffix, at_end = True)
+    
+    def containing(self, text: str) -> list[str]:
+        return self.search_text(text, at_end = False)
+    
+    def search_text(self, text: str, at_end: bool) -> list[str]:
+        # Walks the graph matching `text` as it goes (Knuth-Morris-Pratt). While no match is under way,
+        # nodes with no path below them holding the text are skipped.
+        if not text:
+            return list(self.words_below(0))
+        
+        failure = [0] * len(text)
+        matched = 0
+        for index in range(1, len(text)):
+            while matched and text[index] != text[matched]:
+                matched = failure[matched - 1]
+            if text[index] == text[matched]:
+                matched += 1
+            failure[index] = matched
+        
+        def advance(state: int, letter: str) -> int:
+            if state == len(text):
+                if not at_end:
+                    return state # Contained once is enough
+                state = failure[state - 1]
+            while state and text[state] != letter:
+                state = failure[state - 1]
+            return state + 1 if text[state] == letter else 0
+        
+        reachable: dict[int, bool] = {}
+        def holds_text(node: int) -> bool:
+            if node not in reachable:
+                end = self.follow(node, text)
+                found = end is not None and (self.finals[end] or not at_end)
+                reachable[node] = found or any(holds_text(self.targets[edge]) for edge in range(self.first[node], self.first[node + 1]))
+            return reachable[node]
+        
+        words = []
+        stack = [(0, "", 0)]
+        while stack:
+            node, word, state = stack.pop()
+            if self.finals[node] and state == len(text):
+                words.append(word)
+            for edge in reversed(range(self.first[node], self.first[node + 1])):
+                letter = chr(self.labels[edge])
+                next_state = advance(state, letter)
+                if next_state or holds_text(self.targets[edge]):
+                    stack.append((self.targets[edge], word + letter, next_state))
+        
+        return words
+    
+    def save(self, path: pathlib.Path):
+        metadata = json.dumps({
+            "names": self.names,
+            "buckets": [[length, start, count] for length, (start, count) in self.bucket_table.items()],
+            "letters": [[length, position, "".join(letters)] for (length, position), letters in self.letter_table.items()],
+        }).encode()
+        metadata += bytes(-(HEADER.size + len(metadata)) % 8) # Keeps the 64 bit arrays aligned
+        header = HEADER.pack(MAGIC, VERSION, len(metadata), len(self.finals), len(self.labels), len(self.positions))
+        
+        temporary = path.with_suffix(".tmp")
+        with open(temporary, "wb") as file:
+            for section in (header, metadata, self.lengths, self.word_masks, self.first, self.labels, self.targets, self.offsets,
+                            self.positions, self.bucket_ranks, self.bucket_rankings, self.word_scores, self.finals, self.word_edges):
+                file.write(section)
+        os.replace(temporary, path)
+    
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "DawgStore":
+        # The arrays are read straight out of the memory mapped file.
+        store = cls.__new__(cls)
+        with open(path, "rb") as file:
+            store.mapping = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        
+        view = memoryview(store.mapping)
+        magic, version, metadata_length, node_count, edge_count, word_count = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} word graph")
+        cursor = HEADER.size
+        
+        def take(size: int, format: str) -> memoryview:
+            nonlocal cursor
+            section = view[cursor:cursor + size * struct.calcsize(format)]
+            cursor += len(section)
+            return section.cast(format)
+        
+        metadata = json.loads(bytes(take(metadata_length, "B")).rstrip(b"\0"))
+        store.names = metadata["names"]
+        store.bucket_table = {length: (start, count) for length, start, count in metadata["buckets"]}
+        store.letter_table = {(length, position): list(letters) for length, position, letters in metadata["letters"]}
+        
+        store.lengths = take(node_count, "Q")
+        store.word_masks = take(word_count, "Q")
+        store.first = take(node_count + 1, "I")
+        store.labels = take(edge_count, "I")
+        store.targets = take(edge_count, "I")
+        store.offsets = take(edge_count, "I")
+        store.positions = take(word_count, "I")
+        store.bucket_ranks = take(word_count, "I")
+        store.bucket_rankings = take(word_count, "I")
+        store.word_scores = take(word_count, "i")
+        store.finals = take(node_count, "B")
+        store.word_edges = take(edge_count, "B")
+        
+        store.finish()
+        return store
\ No newline at end of file
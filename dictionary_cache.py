@@ -0,0 +1,314 @@
+import os, pathlib, mmap, struct, hashlib, json, threading, time
+from array import array
+from collections.abc import Callable, Iterable, Sequence
+
+from word_filter import WordIndex, WordStore, PostingKey, NON_WORD, parse_word_list
+
+CACHE_DIRECTORY = ".cache"
+CACHE_SUFFIX = ".cwdc"
+STORE_NAME = "dictionaries"
+
+MAGIC = b"CWDC"
+VERSION = 3
+
+# Magic, version, manifest length, then word, bucket and posting counts. The manifest follows the header:
+# JSON [[name, mtime (ns), size, digest], ...] for every source, padded to a multiple of four bytes.
+HEADER = struct.Struct("<4sIIIII")
+BUCKET_ENTRY = struct.Struct("<III")      # Length, start, count
+POSTING_ENTRY = struct.Struct("<IIIII")   # Length, position, codepoint, start, count
+
+NON_WORD_CODEPOINT = 0xFFFFFFFF
+
+# Told what is being done and the fraction of loading done, from 0 to 1.
+Progress = Callable[[str, float], object]
+
+def no_progress(stage: str, fraction: float):
+    pass
+
+def file_digest(path: pathlib.Path) -> bytes:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "blake2s").digest()
+
+def read_words(path: pathlib.Path) -> tuple[list[str], list[int]]:
+    # One word per line, optionally scored as "WORD;50".
+    with open(path) as file:
+        return parse_word_list(file.read().split("\n"))
+
+def uint32_array(values = ()) -> array:
+    return array("I", values)
+
+def source_manifest(sources: dict[str, pathlib.Path]) -> list[list]:
+    manifest = []
+    for name, source in sources.items():
+        stat = os.stat(source)
+        manifest.append([name, stat.st_mtime_ns, stat.st_size, file_digest(source).hex()])
+    return manifest
+
+def read_sources(sources: dict[str, pathlib.Path], progress: Progress = no_progress, workers: int | None = None) -> dict[str, tuple[list[str], list[int]]]:
+    # Several sources are parsed in parallel, one per process. Processes are spawned rather than
+    # forked, as this runs on a loading thread next to the editor's other threads.
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    if workers < 2:
+        lists = {}
+        for number, (name, source) in enumerate(sources.items()):
+            progress(f"reading {name}", 0.4 * number / len(sources))
+            lists[name] = read_words(source)
+        return lists
+    
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    progress(f"reading {len(sources)} dictionaries", 0)
+    lists = {}
+    with ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context("spawn")) as executor:
+        for name, words in zip(sources, executor.map(read_words, sources.values())):
+            lists[name] = words
+            progress(f"reading {len(sources)} dictionaries", 0.4 * len(lists) / len(sources))
+    return lists
+
+def compile_store(sources: dict[str, pathlib.Path], target: pathlib.Path, progress: Progress = no_progress, workers: int | None = None) -> pathlib.Path:
+    # Words in more than one source are written once, with a mask of the sources holding them.
+    manifest = json.dumps(source_manifest(sources)).encode()
+    manifest += bytes(-len(manifest) % 4)
+    
+    lists = read_sources(sources, progress, workers)
+    
+    progress("indexing", 0.4)
+    index = WordStore({name: words for name, (words, _) in lists.items()}, {name: scores for name, (_, scores) in lists.items()})
+    words = [word for bucket in index.buckets.values() for word in bucket]
+    scores = [score for length in index.buckets for score in index.bucket_scores(length)]
+    masks = [mask for length in index.buckets for mask in index.bucket_masks(length)]
+    
+    offsets = uint32_array([0])
+    blob = bytearray()
+    for word in words:
+        blob += word.encode()
+        offsets.append(len(blob))
+    blob += bytes(-len(blob) % 4) # Keeps the arrays after the blob aligned
+    
+    bucket_table = bytearray()
+    bucket_words = uint32_array()
+    bucket_ids = {}
+    for word_id, word in enumerate(words):
+        bucket_ids.setdefault(len(word), []).append(word_id)
+    bucket_rankings = uint32_array()
+    for length, ids in bucket_ids.items():
+        bucket_table += BUCKET_ENTRY.pack(length, len(bucket_words), len(ids))
+        bucket_words.extend(ids)
+        bucket_rankings.extend(index.ranking(length))
+    
+    posting_table = bytearray()
+    posting_data = uint32_array()
+    for (length, position, letter), posting in index.postings.items():
+        codepoint = NON_WORD_CODEPOINT if letter == NON_WORD else ord(letter)
+        posting_table += POSTING_ENTRY.pack(length, position, codepoint, len(posting_data), len(posting))
+        posting_data.extend(sorted(posting))
+    
+    progress("writing cache", 0.9)
+    header = HEADER.pack(MAGIC, VERSION, len(manifest), len(words), len(bucket_ids), len(index.postings))
+    
+    target.parent.mkdir(exist_ok = True)
+    temporary = target.with_suffix(".tmp")
+    with open(temporary, "wb") as file:
+        for section in (header, manifest, offsets, blob, bucket_table, bucket_words, bucket_rankings, array("i", scores),
+                        posting_table, posting_data, array("Q", masks)):
+            file.write(section)
+    os.replace(temporary, target)
+    
+    return target
+
+def read_manifest(target: pathlib.Path) -> list[list] | None:
+    try:
+        with open(target, "rb") as file:
+            magic, version, manifest_length, *_ = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            return json.loads(file.read(manifest_length).rstrip(b"\0"))
+    except (OSError, struct.error, ValueError):
+        return None
+
+def is_fresh(sources: dict[str, pathlib.Path], target: pathlib.Path) -> bool:
+    manifest = read_manifest(target)
+    if manifest is None or [entry[0] for entry in manifest] != list(sources):
+        return False
+    
+    for name, mtime, size, digest in manifest:
+        stat = os.stat(sources[name])
+        if stat.st_mtime_ns == mtime and stat.st_size == size:
+            continue
+        # Touched but unchanged sources (e.g. after a checkout) keep their cache.
+        if stat.st_size != size or file_digest(sources[name]).hex() != digest:
+            return False
+    
+    return True
+
+class CompiledWordIndex(WordIndex, Sequence[str]):
+    # A dictionary and its index read straight out of a memory mapped cache file.
+    # Words, buckets and postings are only decoded when a query first needs them.
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        
+        view = memoryview(self.mapping)
+        _, _, manifest_length, word_count, bucket_count, posting_count = HEADER.unpack_from(view)
+        cursor = HEADER.size
+        
+        def take(size: int) -> memoryview:
+            nonlocal cursor
+            section = view[cursor:cursor + size]
+            cursor += size
+            return section
+        
+        self.manifest = json.loads(bytes(take(manifest_length)).rstrip(b"\0"))
+        self.offsets = take(4 * (word_count + 1)).cast("I")
+        self.blob = take(self.offsets[-1] + (-self.offsets[-1] % 4))
+        
+        self.bucket_table = {length: (start, count) for length, start, count in BUCKET_ENTRY.iter_unpack(take(BUCKET_ENTRY.size * bucket_count))}
+        self.bucket_words = take(4 * sum(count for _, count in self.bucket_table.values())).cast("I")
+        self.bucket_rankings = take(4 * len(self.bucket_words)).cast("I")
+        self.word_scores = take(4 * word_count).cast("i")
+        
+        self.posting_table = {}
+        total = 0
+        for length, position, codepoint, start, count in POSTING_ENTRY.iter_unpack(take(POSTING_ENTRY.size * posting_count)):
+            letter = NON_WORD if codepoint == NON_WORD_CODEPOINT else chr(codepoint)
+            self.posting_table[length, position, letter] = (start, count)
+            total += count
+        self.posting_data = take(4 * total).cast("I")
+        self.word_masks = take(8 * word_count).cast("Q")
+        
+        self.buckets = {}
+        self.postings = {}
+        self.scores = {}
+        self.rankings = {}
+        self.letter_table = None
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+    
+    def bucket(self, length: int) -> Sequence[str]:
+        if length not in self.buckets:
+            start, count = self.bucket_table.get(length, (0, 0))
+            self.buckets[length] = [self[word_id] for word_id in self.bucket_words[start:start + count]]
+        return self.buckets[length]
+    
+    def bucket_scores(self, length: int) -> Sequence[int]:
+        if length not in self.scores:
+            start, count = self.bucket_table.get(length, (0, 0))
+            self.scores[length] = [self.word_scores[word_id] for word_id in self.bucket_words[start:start + count]]
+        return self.scores[length]
+    
+    def ranking(self, length: int) -> Sequence[int]:
+        # Ranked when the cache was compiled, so nothing needs sorting here.
+        start, count = self.bucket_table.get(length, (0, 0))
+        return self.bucket_rankings[start:start + count]
+    
+    def posting_keys(self) -> Iterable[PostingKey]:
+        return self.posting_table.keys()
+    
+    def posting(self, length: int, position: int, letter: str) -> set[int]:
+        key = (length, position, letter)
+        if key not in self.postings:
+            start, count = self.posting_table.get(key, (0, 0))
+            self.postings[key] = set(self.posting_data[start:start + count])
+        return self.postings[key]
+
+class CompiledWordStore(CompiledWordIndex, WordStore):
+    # A compiled cache of several sources, used wherever a WordStore is.
+    def __init__(self, path: pathlib.Path):
+        super().__init__(path)
+        self.names = [entry[0] for entry in self.manifest]
+        self.masks = {}
+    
+    def bucket_masks(self, length: int) -> Sequence[int]:
+        if length not in self.masks:
+            start, count = self.bucket_table.get(length, (0, 0))
+            self.masks[length] = [self.word_masks[word_id] for word_id in self.bucket_words[start:start + count]]
+        return self.masks[length]
+
+def find_sources(directory: pathlib.Path) -> dict[str, pathlib.Path]:
+    sources = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file(): continue
+            sources[entry.name] = pathlib.Path(directory, entry.name)
+    return dict(sorted(sources.items()))
+
+def load_word_store(directory: pathlib.Path, progress: Progress = no_progress) -> CompiledWordStore:
+    # Every dictionary in `directory` compiled into one store, rebuilt when any of them changes.
+    sources = find_sources(directory)
+    if len(sources) > 64:
+        raise ValueError("A word store holds at most 64 dictionaries")
+    
+    progress("checking cache", 0)
+    target = pathlib.Path(directory, CACHE_DIRECTORY, STORE_NAME + CACHE_SUFFIX)
+    if not is_fresh(sources, target):
+        compile_store(sources, target, progress)
+    return CompiledWordStore(target)
+
+class DictionaryLoader:
+    # Loads a word store on a background thread, so the editor can open before the dictionaries are read.
+    # Lookups block in `wait` until it is done; `when_loaded` callbacks run on the loading thread first.
+    def __init__(self, load: Callable[[Progress], WordStore]):
+        self.load = load
+        self.stage, self.fraction = "starting", 0.0
+        self.store: WordStore | None = None
+        self.error: Exception | None = None
+        self.elapsed: float | None = None
+        self.callbacks: list[Callable[[WordStore], object]] = []
+        self.lock = threading.Lock()
+        self.loaded = threading.Event()
+        self.thread = threading.Thread(target = self.run, name = "dictionary loader", daemon = True)
+        self.thread.start()
+    
+    def report(self, stage: str, fraction: float):
+        self.stage, self.fraction = stage, fraction
+    
+    def run(self):
+        start = time.perf_counter()
+        try:
+            store = self.load(self.report)
+        except Exception as error:
+            store, self.error = None, error
+        
+        with self.lock:
+            self.store = store
+            self.elapsed = time.perf_counter() - start
+            if store is not None:
+                for callback in self.callbacks:
+                    callback(store)
+            self.loaded.set()
+    
+    def when_loaded(self, callback: Callable[[WordStore], object]):
+        with self.lock:
+            if not self.loaded.is_set():
+                self.callbacks.append(callback)
+                return
+        if self.store is not None:
+            callback(self.store)
+    
+    @property
+    def ready(self) -> bool:
+        return self.loaded.is_set()
+    
+    def wait(self, timeout: float | None = None) -> WordStore | None:
+        # None if loading failed, or is still going after `timeout` seconds.
+        self.loaded.wait(timeout)
+        return self.store
+    
+    def status(self) -> str:
+        if self.error is not None:
+            return f"Could not load dictionaries: {self.error}"
+        if self.ready:
+            return f"Dictionaries loaded in {self.elapsed:.2f}s"
+        return f"Loading dictionaries: {self.stage} ({self.fraction:.0%})"
+
+def load_in_background(directory: pathlib.Path) -> DictionaryLoader:
+    return DictionaryLoader(lambda progress: load_word_store(directory, progress))
\ No newline at end of file
@@ -0,0 +1,262 @@
+from matrix import Matrix, CompactMatrix, SIDE_TABLE
+from slots import Direction, Position
+
+from array import array
+from collections.abc import Callable
+from dataclasses import dataclass, field
+import json, mmap, os, pathlib, struct, threading, time, zlib
+
+MAGIC = b"CWDOC"
+VERSION = 1
+ARCHIVE_MAGIC = b"CWARC"
+
+# Magic, version, section count, then one table entry per section.
+HEADER = struct.Struct("<5sHH")
+SECTION_ENTRY = struct.Struct("<4sQII") # Tag, offset, stored length, raw length
+ARCHIVE_HEADER = struct.Struct("<5sHI")  # Magic, version, document count, then (offset, length) pairs
+ARCHIVE_ENTRY = struct.Struct("<QQ")
+
+# Sections, each compressed on its own so a reader only inflates what it asks for.
+DIMENSIONS = b"DIMS"
+FILLED     = b"FILL" # One bit per square
+CHARACTERS = b"CHAR" # uint32 code points, SIDE_TABLE for rebus squares
+REBUS      = b"REBS" # JSON {square index: string}
+COLOURS    = b"COLR" # Palette then uint16 palette indices
+CLUES      = b"CLUE" # JSON [[direction, row, column, clue], ...]
+METADATA   = b"META" # JSON object
+
+Clues = dict[tuple[Direction, Position], str] # Keyed by direction and the entry's first square
+
+@dataclass
+class CrosswordDocument:
+    matrix: Matrix
+    clues: Clues = field(default_factory = dict)
+    metadata: dict[str, str] = field(default_factory = dict)
+
+def pack_bits(flags: bytes) -> bytes:
+    return bytes(sum(flags[index + bit] << bit for bit in range(min(8, len(flags) - index))) for index in range(0, len(flags), 8))
+
+def unpack_bits(data: bytes, count: int) -> bytearray:
+    return bytearray(data[index >> 3] >> (index & 7) & 1 for index in range(count))
+
+def encode_grid(matrix: Matrix) -> dict[bytes, bytes]:
+    rows, columns = matrix.dimensions
+    
+    if isinstance(matrix, CompactMatrix):
+        storage = matrix.storage
+        filled = storage.filled
+        characters = storage.characters
+        rebus = {str(index): string for index, string in storage.strings.items()}
+        palette = matrix.palette
+        colours = storage.colours
+    else:
+        squares = [square for row in matrix.contents for square in row]
+        filled = bytes(square.filled for square in squares)
+        characters = array("I", [ord(square.character) if len(square.character) == 1 else SIDE_TABLE for square in squares])
+        rebus = {str(index): square.character for index, square in enumerate(squares) if len(square.character) != 1}
+        palette_indices = {}
+        colours = array("H", [palette_indices.setdefault(tuple(square.colour), len(palette_indices)) for square in squares])
+        palette = list(palette_indices)
+    
+    return {
+        DIMENSIONS: struct.pack("<II", rows, columns),
+        FILLED: pack_bits(filled),
+        CHARACTERS: characters.tobytes(),
+        REBUS: json.dumps(rebus).encode(),
+        COLOURS: struct.pack("<I", len(palette)) + bytes(channel for colour in palette for channel in colour) + colours.tobytes(),
+    }
+
+def encode_document(document: CrosswordDocument) -> dict[bytes, bytes]:
+    sections = encode_grid(document.matrix)
+    sections[CLUES] = json.dumps([[direction.name, *position, clue] for (direction, position), clue in document.clues.items()]).encode()
+    sections[METADATA] = json.dumps(document.metadata).encode()
+    return sections
+
+def pack_sections(sections: dict[bytes, bytes], compressed: dict[bytes, bytes] | None = None) -> bytes:
+    compressed = {tag: zlib.compress(raw, 1) for tag, raw in sections.items()} if compressed is None else compressed
+    offset = HEADER.size + SECTION_ENTRY.size * len(sections)
+    
+    table = bytearray(HEADER.pack(MAGIC, VERSION, len(sections)))
+    for tag, raw in sections.items():
+        table += SECTION_ENTRY.pack(tag, offset, len(compressed[tag]), len(raw))
+        offset += len(compressed[tag])
+    
+    return bytes(table) + b"".join(compressed[tag] for tag in sections)
+
+def write_atomically(path: pathlib.Path, data: bytes):
+    temporary = pathlib.Path(f"{path}.tmp")
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+def save_document(path: pathlib.Path, document: CrosswordDocument):
+    write_atomically(path, pack_sections(encode_document(document)))
+
+class DocumentReader:
+    # Reads the section table up front; sections are only inflated when asked for.
+    def __init__(self, data: bytes | memoryview):
+        self.data = memoryview(data)
+        magic, version, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError("Not a crossword document, or one from a newer version")
+        
+        self.sections: dict[bytes, tuple[int, int, int]] = {}
+        for index in range(count):
+            tag, offset, length, raw_length = SECTION_ENTRY.unpack_from(self.data, HEADER.size + SECTION_ENTRY.size * index)
+            self.sections[tag] = (offset, length, raw_length)
+    
+    def section(self, tag: bytes) -> bytes:
+        if tag not in self.sections:
+            return b""
+        offset, length, _ = self.sections[tag]
+        return zlib.decompress(self.data[offset:offset + length])
+    
+    def dimensions(self) -> tuple[int, int]:
+        return struct.unpack("<II", self.section(DIMENSIONS))
+    
+    def read_matrix(self, backend: type[Matrix] | type[CompactMatrix] = Matrix) -> Matrix:
+        rows, columns = self.dimensions()
+        size = rows * columns
+        
+        filled = unpack_bits(self.section(FILLED), size)
+        characters = array("I")
+        characters.frombytes(self.section(CHARACTERS))
+        rebus = {int(index): string for index, string in json.loads(self.section(REBUS)).items()}
+        
+        colour_data = self.section(COLOURS)
+        palette_size, = struct.unpack_from("<I", colour_data)
+        palette = [tuple(colour_data[4 + 3 * index:7 + 3 * index]) for index in range(palette_size)]
+        colours = array("H")
+        colours.frombytes(colour_data[4 + 3 * palette_size:])
+        
+        matrix = backend(rows, columns, palette[0] if palette else (255, 255, 255))
+        
+        if isinstance(matrix, CompactMatrix):
+            # The sections already have the compact layout, so they are used as they are.
+            for colour in palette:
+                matrix.colour_index(colour)
+            matrix.storage.filled = filled
+            matrix.storage.characters = characters
+            matrix.storage.strings = rebus
+            matrix.storage.colours = array("H", [matrix.palette_indices[palette[index]] for index in colours])
+            return matrix
+        
+        for index in range(size):
+            square = matrix[divmod(index, columns)]
+            square.filled = bool(filled[index])
+            square.character = rebus[index] if characters[index] == SIDE_TABLE else chr(characters[index])
+            square.colour = palette[colours[index]]
+        
+        return matrix
+    
+    def read_clues(self) -> Clues:
+        return {(Direction[direction], (row, column)): clue for direction, row, column, clue in json.loads(self.section(CLUES) or b"[]")}
+    
+    def read_metadata(self) -> dict[str, str]:
+        return json.loads(self.section(METADATA) or b"{}")
+    
+    def read_document(self, backend: type[Matrix] | type[CompactMatrix] = Matrix) -> CrosswordDocument:
+        return CrosswordDocument(self.read_matrix(backend), self.read_clues(), self.read_metadata())
+
+def open_document(path: pathlib.Path) -> DocumentReader:
+    with open(path, "rb") as file:
+        return DocumentReader(mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ))
+
+def load_document(path: pathlib.Path, backend: type[Matrix] | type[CompactMatrix] = Matrix) -> CrosswordDocument:
+    return open_document(path).read_document(backend)
+
+def save_archive(path: pathlib.Path, documents: list[CrosswordDocument]):
+    blobs = [pack_sections(encode_document(document)) for document in documents]
+    offset = ARCHIVE_HEADER.size + ARCHIVE_ENTRY.size * len(blobs)
+    
+    table = bytearray(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, VERSION, len(blobs)))
+    for blob in blobs:
+        table += ARCHIVE_ENTRY.pack(offset, len(blob))
+        offset += len(blob)
+    
+    write_atomically(path, bytes(table) + b"".join(blobs))
+
+class ArchiveReader:
+    # Many documents in one memory mapped file; each is parsed only when indexed.
+    def __init__(self, path: pathlib.Path):
+        with open(path, "rb") as file:
+            self.data = memoryview(mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ))
+        
+        magic, version, count = ARCHIVE_HEADER.unpack_from(self.data)
+        if magic != ARCHIVE_MAGIC or version > VERSION:
+            raise ValueError("Not a crossword archive, or one from a newer version")
+        self.entries = list(ARCHIVE_ENTRY.iter_unpack(self.data[ARCHIVE_HEADER.size:ARCHIVE_HEADER.size + ARCHIVE_ENTRY.size * count]))
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def __getitem__(self, index: int) -> DocumentReader:
+        offset, length = self.entries[index]
+        return DocumentReader(self.data[offset:offset + length])
+
+def autosave_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(f"{path.name}.autosave")
+
+class Autosaver:
+    # Saves a document from a background thread at most every `interval` seconds while it has unsaved edits.
+    # Sections are only recompressed when their contents changed since the last save.
+    # Marking the document dirty is free; `tick`, called from the thread editing the document, encodes
+    # a snapshot once an interval has passed, so the autosave thread only ever sees bytes.
+    # Nothing is saved while `path` is None.
+    def __init__(self, path: pathlib.Path | None, document: Callable[[], CrosswordDocument], interval: float = 10):
+        self.path = path
+        self.document = document
+        self.interval = interval
+        self.dirty = False # Edited since the last snapshot
+        self.snapshot_time = time.perf_counter()
+        self.ready = threading.Event() # A snapshot is waiting to be saved
+        self.stopping = threading.Event()
+        self.pending: dict[bytes, bytes] = {} # Sections of the latest snapshot
+        self.written: dict[bytes, tuple[bytes, bytes]] = {} # Tag to (raw, compressed) of the last save
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target = self.run, name = "autosave", daemon = True)
+        self.thread.start()
+    
+    def mark_dirty(self):
+        self.dirty = True
+    
+    def tick(self):
+        if self.dirty and self.path is not None and time.perf_counter() - self.snapshot_time >= self.interval:
+            self.snapshot()
+    
+    def snapshot(self):
+        # The snapshot is in place before the thread is woken, and save clears the flag before reading it,
+        # so a save never misses the latest snapshot.
+        self.pending = encode_document(self.document())
+        self.dirty = False
+        self.snapshot_time = time.perf_counter()
+        self.ready.set()
+    
+    def save(self) -> bool:
+        with self.lock:
+            self.ready.clear()
+            sections = self.pending
+            if self.path is None or not sections:
+                return False
+            changed = [tag for tag, raw in sections.items() if tag not in self.written or self.written[tag][0] != raw]
+            if not changed:
+                return False
+            
+            for tag in changed:
+                self.written[tag] = (sections[tag], zlib.compress(sections[tag], 1))
+            
+            write_atomically(self.path, pack_sections(sections, {tag: self.written[tag][1] for tag in sections}))
+            return True
+    
+    def run(self):
+        while self.ready.wait() and not self.stopping.is_set():
+            self.save()
+    
+    def stop(self, save: bool = True):
+        self.stopping.set()
+        self.ready.set()
+        self.thread.join()
+        if save and self.path is not None:
+            if self.dirty:
+                self.snapshot()
+            self.save()
\ No newline at end of file
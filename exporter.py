@@ -1,5 +1,8 @@
 from editor import CrosswordEditor
 from dataclasses import dataclass
+import importlib.util, os, pathlib
+
+EXPORTERS_PATH = pathlib.Path(os.path.dirname(os.path.abspath(__file__)), "exporters")
 
 # File extension, description
 # i.e. ("*.png", "PNG image file") or (".docx", "Microsoft Word document")
@@ -13,4 +16,25 @@ class Exporter:
     settings: dict[str, type]           # Additional settings (like size, image quality, etc.) that can be inputted
     
     def export(self, editor: CrosswordEditor, name: str) -> bool:
-        pass
\ No newline at end of file
+        pass
+    
+    def setting(self, editor: CrosswordEditor, key: str, default = None):
+        # Values for `settings`, given by whoever started the export.
+        return getattr(editor, "export_settings", {}).get(key, default)
+
+def discover_exporters(directory: pathlib.Path = EXPORTERS_PATH) -> dict[str, Exporter]:
+    # Every Exporter instance defined at the top level of a module in `directory`, by name.
+    exporters = {}
+    
+    for path in sorted(directory.glob("*.py")):
+        if path.name.startswith("_"): continue
+        
+        spec = importlib.util.spec_from_file_location(f"exporters.{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        for value in vars(module).values():
+            if isinstance(value, Exporter):
+                exporters[value.name] = value
+    
+    return exporters
\ No newline at end of file
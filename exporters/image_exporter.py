@@ -0,0 +1,37 @@
+from exporter import Exporter
+from editor import CrosswordEditor
+from gui.app_theme import AppTheme
+from gui.offscreen_renderer import TileAtlas, layout_puzzle, save_png, save_svg
+from gui.crossword_square import FontCache
+
+from dataclasses import dataclass
+
+@dataclass
+class PNGExporter(Exporter):
+    def export(self, editor: CrosswordEditor, name: str) -> bool:
+        theme = getattr(editor, "theme", AppTheme())
+        dpi = self.setting(editor, "dpi", 300)
+        layout = layout_puzzle(editor.matrix, square_size = self.setting(editor, "square_size", 0.3))
+        
+        # The blank puzzle and the answer key share the layout and the tile atlas.
+        atlas = TileAtlas(max(round(layout.square_size * dpi), 1), theme, FontCache(theme.cw_font))
+        save_png(f"{name}.png", layout, theme, dpi, False, atlas)
+        if self.setting(editor, "answers", True):
+            save_png(f"{name}_answers.png", layout, theme, dpi, True, atlas)
+        
+        return True
+
+@dataclass
+class SVGExporter(Exporter):
+    def export(self, editor: CrosswordEditor, name: str) -> bool:
+        theme = getattr(editor, "theme", AppTheme())
+        layout = layout_puzzle(editor.matrix, square_size = self.setting(editor, "square_size", 0.3))
+        
+        save_svg(f"{name}.svg", layout, theme, False)
+        if self.setting(editor, "answers", True):
+            save_svg(f"{name}_answers.svg", layout, theme, True)
+        
+        return True
+
+PNG_EXPORTER = PNGExporter("PNG image", "crossword-maker", ("*.png", "PNG image file"), {"dpi": int, "square_size": float, "answers": bool})
+SVG_EXPORTER = SVGExporter("SVG image", "crossword-maker", ("*.svg", "Scalable vector image"), {"square_size": float, "answers": bool})
\ No newline at end of file
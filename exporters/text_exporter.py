@@ -0,0 +1,38 @@
+from exporter import Exporter
+from editor import CrosswordEditor
+from slots import Direction, SlotIndex
+
+from dataclasses import dataclass
+
+@dataclass
+class TextExporter(Exporter):
+    def export(self, editor: CrosswordEditor, name: str) -> bool:
+        matrix = editor.matrix
+        slots = SlotIndex(matrix)
+        show_answers = self.setting(editor, "answers", True)
+        
+        lines = []
+        for row in matrix.contents:
+            cells = []
+            for square in row:
+                if square.filled:
+                    cells.append("#")
+                elif not show_answers or square.character.isspace() or square.character == "":
+                    cells.append(".")
+                else:
+                    cells.append(square.character.upper() if len(square.character) == 1 else f"[{square.character.upper()}]")
+            lines.append(" ".join(cells))
+        
+        for direction in Direction:
+            lines += ["", direction.name.title()]
+            entries = sorted((slots.number(slot), slot) for slot in slots.all_slots() if slot.direction == direction)
+            for number, slot in entries:
+                clue = editor.clues.get((direction, slot.cells[0]), "")
+                lines.append(f"{number}. {clue}")
+        
+        with open(f"{name}.txt", "w", encoding = "utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        
+        return True
+
+TEXT_EXPORTER = TextExporter("Plain text", "crossword-maker", ("*.txt", "Plain text grid and clues"), {"answers": bool})
\ No newline at end of file
@@ -0,0 +1,271 @@
+import sys, pathlib, argparse, json
+
+from collections import deque
+from dataclasses import dataclass, asdict
+
+from matrix import Matrix
+from slots import Slot, SlotIndex, Position, Direction
+from document import load_document
+
+def white_neighbours(matrix: Matrix, position: Position) -> list[Position]:
+    rows, columns = matrix.dimensions
+    row, column = position
+    candidates = ((row - 1, column), (row + 1, column), (row, column - 1), (row, column + 1))
+    return [(r, c) for r, c in candidates if 0 <= r < rows and 0 <= c < columns and not matrix[r, c].filled]
+
+@dataclass(eq = False)
+class Search:
+    frontier: deque[Position]
+    cells: set[Position]
+
+class WhiteRegions:
+    # Connected regions of white squares, as a label per square and the squares holding each label.
+    # Whitening a square merges its neighbours' regions, relabelling the smaller ones into the largest.
+    # Filling one searches outwards from each white neighbour in lockstep: a search that runs out of
+    # squares before meeting another has found a region split off, so the work is bounded by the
+    # smaller side of the split rather than the grid. Squares filled together are removed together, as
+    # a region can only be split correctly once every square filling it is out of the way.
+    def __init__(self, matrix: Matrix):
+        self.matrix = matrix
+        self.labels: dict[Position, int] = {}
+        self.regions: dict[int, set[Position]] = {}
+        self.next_label = 0
+        self.rebuild()
+    
+    def rebuild(self):
+        self.labels.clear()
+        self.regions.clear()
+        rows, columns = self.matrix.dimensions
+        
+        for row in range(rows):
+            for column in range(columns):
+                if (row, column) in self.labels or self.matrix[row, column].filled:
+                    continue
+                
+                region = {(row, column)}
+                queue = deque(region)
+                while queue:
+                    for neighbour in white_neighbours(self.matrix, queue.popleft()):
+                        if neighbour not in region:
+                            region.add(neighbour)
+                            queue.append(neighbour)
+                self.label(region)
+    
+    def label(self, region: set[Position], label: int | None = None) -> int:
+        if label is None:
+            label = self.next_label
+            self.next_label += 1
+            self.regions[label] = set()
+        
+        self.regions[label] |= region
+        for position in region:
+            self.labels[position] = label
+        return label
+    
+    def __len__(self) -> int:
+        return len(self.regions)
+    
+    def add(self, position: Position):
+        # Call after a square is made white.
+        if position in self.labels:
+            return
+        
+        neighbours = {self.labels[neighbour] for neighbour in white_neighbours(self.matrix, position) if neighbour in self.labels}
+        if not neighbours:
+            self.label({position})
+            return
+        
+        largest = max(neighbours, key = lambda label: len(self.regions[label]))
+        for label in neighbours - {largest}:
+            self.label(self.regions.pop(label), largest)
+        self.label({position}, largest)
+    
+    def remove(self, *positions: Position):
+        # Call after squares are filled, with every square filled at once.
+        filled: dict[int, list[Position]] = {}
+        for position in positions:
+            label = self.labels.pop(position, None)
+            if label is not None:
+                self.regions[label].discard(position)
+                filled.setdefault(label, []).append(position)
+        
+        for label, squares in filled.items():
+            if not self.regions[label]:
+                del self.regions[label]
+                continue
+            # Squares whitened alongside are not labelled yet, and join up regions once added.
+            starts = dict.fromkeys(start for square in squares for start in white_neighbours(self.matrix, square) if self.labels.get(start) == label)
+            self.split(label, list(starts))
+    
+    def split(self, label: int, starts: list[Position]):
+        if len(starts) < 2:
+            return
+        region = self.regions[label]
+        
+        owners: dict[Position, Search] = {}
+        searches = []
+        for start in starts:
+            if start in owners: continue
+            search = Search(deque([start]), {start})
+            owners[start] = search
+            searches.append(search)
+        
+        while len(searches) > 1:
+            for search in list(searches):
+                if search not in searches:
+                    continue # Merged into another search this round
+                
+                if not search.frontier:
+                    # Everything reachable from here has been seen without meeting another search.
+                    region -= search.cells
+                    self.label(search.cells)
+                    searches.remove(search)
+                    if len(searches) == 1:
+                        break
+                    continue
+                
+                for neighbour in white_neighbours(self.matrix, search.frontier.popleft()):
+                    if self.labels.get(neighbour) != label:
+                        continue
+                    owner = owners.get(neighbour)
+                    if owner is None:
+                        owners[neighbour] = search
+                        search.cells.add(neighbour)
+                        search.frontier.append(neighbour)
+                    elif owner is not search:
+                        # Met another search, so both sides are still one region.
+                        large, small = (search, owner) if len(search.cells) >= len(owner.cells) else (owner, search)
+                        for cell in small.cells:
+                            owners[cell] = large
+                        large.cells |= small.cells
+                        large.frontier.extend(small.frontier)
+                        searches.remove(small)
+                        search = large
+    
+    def region_of(self, position: Position) -> set[Position]:
+        return self.regions[self.labels[position]]
+
+@dataclass
+class HealthReport:
+    words: int
+    letters: int
+    short_entries: int # Entries below the minimum length
+    unchecked: int     # White squares in only one entry
+    regions: int       # Separate areas of white squares
+    
+    @property
+    def average_length(self) -> float:
+        return self.letters / self.words if self.words else 0
+    
+    @property
+    def connected(self) -> bool:
+        return self.regions <= 1
+    
+    @property
+    def healthy(self) -> bool:
+        return self.short_entries == 0 and self.unchecked == 0 and self.connected
+    
+    def problems(self) -> list[str]:
+        problems = []
+        if self.short_entries:
+            problems.append(f"{self.short_entries} short entries")
+        if self.unchecked:
+            problems.append(f"{self.unchecked} unchecked squares")
+        if not self.connected:
+            problems.append(f"{self.regions} separate regions")
+        return problems
+    
+    def summary(self) -> str:
+        return ", ".join([f"{self.words} words", f"{self.average_length:.2f} average length"] + (self.problems() or ["no problems"]))
+
+class GridHealth:
+    # Word count, average length, short entries, unchecked squares and connectivity, kept up to date
+    # as squares are filled and cleared. Counts are kept per line, so a toggle only recounts its row
+    # and column, read from the slot index that already rescans them.
+    def __init__(self, matrix: Matrix, slots: SlotIndex | None = None, minimum_length: int = 3):
+        self.minimum_length = minimum_length
+        self.rebuild(matrix, slots)
+    
+    def rebuild(self, matrix: Matrix, slots: SlotIndex | None = None):
+        self.matrix = matrix
+        self.slots = SlotIndex(matrix) if slots is None else slots
+        self.regions = WhiteRegions(matrix)
+        self.line_counts: dict[tuple[Direction, int], tuple[int, int, int]] = {} # Words, letters and short entries
+        self.unchecked: set[Position] = set()
+        self.words = self.letters = self.short_entries = 0
+        
+        for key in self.slots.lines:
+            self.count_line(key)
+        for position in self.slots.cells:
+            self.check_square(position)
+    
+    def count_line(self, key: tuple[Direction, int]):
+        words, letters, short = self.line_counts.get(key, (0, 0, 0))
+        self.words -= words
+        self.letters -= letters
+        self.short_entries -= short
+        
+        slots = self.slots.lines[key]
+        counts = (len(slots), sum(len(slot.cells) for slot in slots), sum(len(slot.cells) < self.minimum_length for slot in slots))
+        self.line_counts[key] = counts
+        self.words += counts[0]
+        self.letters += counts[1]
+        self.short_entries += counts[2]
+    
+    def check_square(self, position: Position):
+        across, down = self.slots.slots_at(position)
+        if not self.matrix[*position].filled and (across is None or down is None):
+            self.unchecked.add(position)
+        else:
+            self.unchecked.discard(position)
+    
+    def update(self, *positions: Position):
+        # Call after toggling the filled state of the squares at positions, once the slot index is updated.
+        # Squares toggled together, as by symmetrical editing or a paste, are passed together.
+        rows, columns = self.matrix.dimensions
+        changed_rows = {row for row, _ in positions}
+        changed_columns = {column for _, column in positions}
+        
+        for row in changed_rows:
+            self.count_line((Direction.ACROSS, row))
+            for other in range(columns):
+                self.check_square((row, other))
+        for column in changed_columns:
+            self.count_line((Direction.DOWN, column))
+            for other in range(rows):
+                self.check_square((other, column))
+        
+        self.regions.remove(*(position for position in positions if self.matrix[*position].filled))
+        for position in positions:
+            if not self.matrix[*position].filled:
+                self.regions.add(position)
+    
+    def short_slots(self) -> list[Slot]:
+        return [slot for slot in self.slots.all_slots() if len(slot.cells) < self.minimum_length]
+    
+    def report(self) -> HealthReport:
+        return HealthReport(self.words, self.letters, self.short_entries, len(self.unchecked), len(self.regions))
+
+def analyze(matrix: Matrix, minimum_length: int = 3) -> HealthReport:
+    return GridHealth(matrix, minimum_length = minimum_length).report()
+
+def main(arguments: list[str]) -> int:
+    parser = argparse.ArgumentParser(description = "Check crossword documents for short entries, unchecked squares and disconnected regions.")
+    parser.add_argument("sources", nargs = "+", type = pathlib.Path, help = "Crossword documents (.cwd) to check")
+    parser.add_argument("-m", "--minimum-length", type = int, default = 3, dest = "minimum_length")
+    parser.add_argument("--json", action = "store_true", help = "Print one JSON line per document")
+    options = parser.parse_args(arguments)
+    
+    unhealthy = 0
+    for source in options.sources:
+        report = analyze(load_document(source).matrix, options.minimum_length)
+        unhealthy += not report.healthy
+        if options.json:
+            print(json.dumps({"source": str(source), **asdict(report), "average_length": report.average_length, "healthy": report.healthy}))
+        else:
+            print(f"{'ok' if report.healthy else 'FAILED':>6}  {source}: {report.summary()}")
+    
+    return 1 if unhealthy else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -13,5 +13,6 @@ class AppTheme:
     
     # Other visual elements
     app_background: Colour = (70, 70, 80)
+    app_text: Colour = (255, 255, 255)
     cursor_colour: Colour = (255, 218, 0)
     highlight: Colour = (167, 216, 255)
\ No newline at end of file
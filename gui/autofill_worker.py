@@ -0,0 +1,56 @@
+from matrix import Matrix
+from word_filter import WordIndex
+import os, threading, time
+import pygame
+
+# Posted while a fill runs, with a `progress` attribute (an autofill.FillProgress).
+FILL_PROGRESS = pygame.event.custom_type()
+
+# Posted when a fill ends, with `matrix`, the filled copy of the grid, and `result` (an
+# autofill.FillResult), or `result` None and the exception raised as `error`.
+FILL_FINISHED = pygame.event.custom_type()
+
+class AutofillWorker:
+    # Runs autofill on a copy of the grid off the UI thread, so the window keeps responding.
+    # One fill runs at a time, and `stop` cancels it.
+    def __init__(self, progress_interval: float = 0.1):
+        self.progress_interval = progress_interval
+        self.thread: threading.Thread | None = None
+        self.cancelled = threading.Event()
+    
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    def start(self, matrix: Matrix, index: WordIndex, time_limit: float) -> bool:
+        if self.running:
+            return False
+        
+        self.cancelled.clear()
+        self.thread = threading.Thread(target = self.run, args = (matrix.deep_copy(), index, time_limit), name = "autofill", daemon = True)
+        self.thread.start()
+        return True
+    
+    def run(self, matrix: Matrix, index: WordIndex, time_limit: float):
+        from autofill import FillBudget, FillProgress, autofill, parallel_autofill
+        posted = 0.0
+        
+        def post_progress(progress: FillProgress):
+            # Throttled, as the single process search reports every few hundred nodes.
+            nonlocal posted
+            if time.perf_counter() - posted >= self.progress_interval:
+                posted = time.perf_counter()
+                pygame.event.post(pygame.event.Event(FILL_PROGRESS, progress = progress))
+        
+        fill = parallel_autofill if (os.cpu_count() or 1) > 1 else autofill
+        try:
+            result = fill(matrix, index, budget = FillBudget(time_limit = time_limit), progress = post_progress, cancelled = self.cancelled.is_set)
+        except Exception as error:
+            pygame.event.post(pygame.event.Event(FILL_FINISHED, matrix = matrix, result = None, error = error))
+            return
+        pygame.event.post(pygame.event.Event(FILL_FINISHED, matrix = matrix, result = result, error = None))
+    
+    def stop(self):
+        self.cancelled.set()
+        if self.thread is not None:
+            self.thread.join()
\ No newline at end of file
@@ -1,10 +1,43 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, astuple
+from collections import OrderedDict
 from matrix import Matrix, SquareContents
-from gui.app_theme import AppTheme
+from gui.app_theme import AppTheme, Colour
+from editor import clamp
 
 from typing import Self
 import pygame
 
+# Highlighting drawn over the grid without touching it: position to (colour, selected).
+Overlay = dict[tuple[int, int], tuple[Colour, bool]]
+
+class FontCache:
+    def __init__(self, name: str):
+        self.name = name
+        self.fonts: dict[int, pygame.font.Font] = {}
+    
+    def get(self, size: int) -> pygame.font.Font:
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.SysFont(self.name, max(size, 1))
+        return self.fonts[size]
+
+class GlyphCache:
+    # With a `limit`, the least recently drawn texts are dropped past that many.
+    def __init__(self, fonts: FontCache, limit: int | None = None):
+        self.fonts = fonts
+        self.limit = limit
+        self.glyphs: OrderedDict[tuple[str, int, Colour], pygame.Surface] = OrderedDict()
+    
+    def get(self, text: str, size: int, colour: Colour) -> pygame.Surface:
+        key = (text, size, colour)
+        if key in self.glyphs:
+            self.glyphs.move_to_end(key)
+            return self.glyphs[key]
+        
+        self.glyphs[key] = self.fonts.get(size).render(text, False, colour)
+        if self.limit is not None and len(self.glyphs) > self.limit:
+            self.glyphs.popitem(last = False)
+        return self.glyphs[key]
+
 @dataclass
 class CrosswordSquare:
     surface: pygame.Surface
@@ -12,7 +45,9 @@ class CrosswordSquare:
     size: int | float
     contents: SquareContents
     theme: AppTheme
-    font: pygame.font.Font
+    glyphs: GlyphCache
+    font_size: int
+    number: int | None = None # Clue number shown in the corner
     
     def new(surface: pygame.Surface, 
             position: pygame.Vector2, 
@@ -29,56 +64,124 @@ class CrosswordSquare:
         pygame.draw.rect(self.surface,
                          self.contents.colour if self.contents.filled and self.contents.selected else self.theme.cw_fill,
                          rect,
-                         width = self.size // 30
+                         width = max(self.size // 30, 1) # A width of 0 would fill the square
                          )
         
-        text = self.font.render(self.contents.character.upper(), False, self.theme.cw_text)
+        text = self.glyphs.get(self.contents.character.upper(), self.font_size, self.theme.cw_text)
         self.surface.blit(text,
                           text.get_rect(center = rect.center)
                           )
+        
+        if self.number is not None:
+            number = self.glyphs.get(str(self.number), self.size // 3, self.theme.cw_text)
+            self.surface.blit(number,
+                              rect.topleft + pygame.Vector2(self.size // 15 + 1)
+                              )
 
 @dataclass
 class RenderedMatrix:
+    # Kept between frames: squares are drawn onto a persistent grid surface, and only squares
+    # that changed since the last frame are redrawn. Resizing or changing the theme redraws everything.
+    # Only the squares inside the viewport are looked at, so a frame costs the same on any grid size.
     matrix: Matrix
     surface: pygame.Surface
     theme: AppTheme
     location: float = 0.5
+    overlay: Overlay = field(default_factory = dict)
+    numbers: dict[tuple[int, int], int] = field(default_factory = dict)
+    preview: bool = False # Hides answers
+    zoom: float = 1 # 1 fits the whole grid, unless its squares would be smaller than minimum_square_size
+    minimum_square_size: int = 24
+    origin: tuple[int, int] = (0, 0) # Top left square of the viewport
+    
+    grid_surface: pygame.Surface | None = field(default = None, init = False)
+    layout: tuple | None = field(default = None, init = False)
+    drawn: list[tuple] = field(default_factory = list, init = False)
+    glyphs: GlyphCache | None = field(default = None, init = False)
+    visible: tuple[int, int] = field(default = (0, 0), init = False) # Rows and columns in the viewport
+    
+    def square_size(self) -> int:
+        shortest_side = min(*self.surface.get_size())
+        fitted = shortest_side // max(*self.matrix.dimensions)
+        return min(max(int(fitted * self.zoom), self.minimum_square_size, 1), shortest_side)
+    
+    def update_layout(self) -> int:
+        screen_rect = self.surface.get_rect()
+        shortest_side = min(*screen_rect.size)
+        square_size = self.square_size()
+        
+        layout = (screen_rect.size, self.matrix.dimensions, astuple(self.theme), square_size)
+        if layout != self.layout:
+            self.layout = layout
+            rows, columns = self.matrix.dimensions
+            self.visible = (min(rows, shortest_side // square_size), min(columns, shortest_side // square_size))
+            self.grid_surface = pygame.Surface((square_size * self.visible[1], square_size * self.visible[0]))
+            self.drawn = [None] * (self.visible[0] * self.visible[1])
+            self.glyphs = GlyphCache(FontCache(self.theme.cw_font))
+            self.scroll(0, 0)
+        
+        return square_size
+    
+    def scroll(self, rows: int, columns: int):
+        self.origin = (clamp(self.origin[0] + rows, 0, self.matrix.dimensions[0] - self.visible[0]),
+                       clamp(self.origin[1] + columns, 0, self.matrix.dimensions[1] - self.visible[1]))
+    
+    def follow(self, position: tuple[int, int], margin: int = 1):
+        # Scrolls just far enough to keep `position` and `margin` squares around it in view.
+        self.update_layout()
+        offsets = []
+        for axis in (0, 1):
+            space = min(margin, (self.visible[axis] - 1) // 2)
+            low, high = self.origin[axis] + space, self.origin[axis] + self.visible[axis] - 1 - space
+            offsets.append(position[axis] - low if position[axis] < low else max(position[axis] - high, 0))
+        self.scroll(*offsets)
+    
+    def set_zoom(self, zoom: float):
+        self.zoom = clamp(zoom, 1, max(*self.matrix.dimensions))
     
     def draw(self):
+        square_size = self.update_layout()
+        
         screen_rect = self.surface.get_rect()
         shortest_side = min(*screen_rect.size)
         longest_side = max(*screen_rect.size)
         
-        square_size = shortest_side // max(*self.matrix.dimensions)
-        
         font_size = square_size * 8 // 10
-        font = pygame.font.SysFont(self.theme.cw_font, font_size)
         
         starting_position = pygame.Vector2(int((longest_side - shortest_side) * self.location),
                                            0
                                            )
-        current_row = 0
-        current_column = 0
+        square_index = 0
+        top, left = self.origin
         
-        for row in self.matrix.contents:
-            for square in row:
-                position = starting_position + pygame.Vector2(current_column, current_row) * square_size
-                if len(square.character) > 1:
-                    font_size = square_size * 8 // (10 * len(square.character))
-                    square_font = pygame.font.SysFont(self.theme.cw_font, font_size)
-                else:
-                    square_font = font
+        for current_row in range(top, top + self.visible[0]):
+            for current_column in range(left, left + self.visible[1]):
+                square = self.matrix[current_row, current_column]
+                highlight = self.overlay.get((current_row, current_column))
+                if highlight is not None or self.preview:
+                    colour, selected = (square.colour, square.selected) if highlight is None else highlight
+                    square = SquareContents(colour, " " if self.preview else square.character, square.filled, selected)
+                number = self.numbers.get((current_row, current_column))
                 
-                CrosswordSquare(
-                    self.surface,
-                    position,
-                    square_size,
-                    square,
-                    self.theme,
-                    square_font
-                ).draw()
-                current_column += 1
-            current_row += 1
-            current_column = 0
+                state = (square.character, square.filled, tuple(square.colour), square.selected, number)
+                if self.drawn[square_index] != state:
+                    self.drawn[square_index] = state
+                    
+                    if len(square.character) > 1:
+                        square_font_size = square_size * 8 // (10 * len(square.character))
+                    else:
+                        square_font_size = font_size
+                    
+                    CrosswordSquare(
+                        self.grid_surface,
+                        pygame.Vector2(current_column - left, current_row - top) * square_size,
+                        square_size,
+                        square,
+                        self.theme,
+                        self.glyphs,
+                        square_font_size,
+                        number
+                    ).draw()
+                square_index += 1
         
-        
\ No newline at end of file
+        self.surface.blit(self.grid_surface, starting_position)
\ No newline at end of file
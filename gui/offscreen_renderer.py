@@ -0,0 +1,183 @@
+from dataclasses import dataclass, field
+from matrix import Matrix
+from slots import SlotIndex
+from gui.app_theme import AppTheme, Colour
+from gui.crossword_square import FontCache
+
+from xml.sax.saxutils import escape
+import pathlib
+import pygame
+
+POINTS_PER_INCH = 72
+
+@dataclass
+class LayoutSquare:
+    row: int
+    column: int
+    x: float
+    y: float
+    filled: bool
+    colour: Colour
+    character: str
+    number: int | None = None
+
+@dataclass
+class PuzzleLayout:
+    # Positions in inches, so one layout can be drawn at any resolution or as vectors.
+    # Blank and answer renders are both drawn from the same layout.
+    rows: int
+    columns: int
+    square_size: float
+    margin: float
+    squares: list[LayoutSquare] = field(default_factory = list)
+    
+    @property
+    def size(self) -> tuple[float, float]:
+        return (self.columns * self.square_size + 2 * self.margin, self.rows * self.square_size + 2 * self.margin)
+
+def layout_puzzle(matrix: Matrix, numbers: dict[tuple[int, int], int] | None = None, square_size: float = 0.3, margin: float = 0.25) -> PuzzleLayout:
+    numbers = SlotIndex(matrix).numbers if numbers is None else numbers
+    rows, columns = matrix.dimensions
+    layout = PuzzleLayout(rows, columns, square_size, margin)
+    
+    for row_index, row in enumerate(matrix.contents):
+        for column_index, square in enumerate(row):
+            layout.squares.append(LayoutSquare(row_index,
+                                               column_index,
+                                               margin + column_index * square_size,
+                                               margin + row_index * square_size,
+                                               square.filled,
+                                               tuple(square.colour),
+                                               "" if square.character.isspace() else square.character.upper(),
+                                               numbers.get((row_index, column_index)),
+                                               ))
+    
+    return layout
+
+class TileAtlas:
+    # Every distinct tile (square backgrounds, letters, clue numbers) is drawn once onto one atlas
+    # surface, and squares are then blitted from it in a single batch.
+    def __init__(self, square_size: int, theme: AppTheme, fonts: FontCache, width: int = 2048):
+        self.square_size = square_size
+        self.theme = theme
+        self.fonts = fonts
+        self.width = max(width, square_size)
+        self.surface = pygame.Surface((self.width, square_size), pygame.SRCALPHA)
+        self.tiles: dict[tuple, pygame.Rect] = {}
+        self.cursor = pygame.Vector2(0, 0)
+        self.shelf_height = 0
+    
+    def allocate(self, size: tuple[int, int]) -> pygame.Rect:
+        # Shelf packing: tiles fill a row left to right, and the atlas grows downwards when needed.
+        width, height = size
+        if self.cursor.x + width > self.width:
+            self.cursor = pygame.Vector2(0, self.cursor.y + self.shelf_height)
+            self.shelf_height = 0
+        
+        if self.cursor.y + height > self.surface.get_height():
+            grown = pygame.Surface((self.width, max(self.surface.get_height() * 2, int(self.cursor.y) + height)), pygame.SRCALPHA)
+            grown.blit(self.surface, (0, 0))
+            self.surface = grown
+        
+        rect = pygame.Rect(int(self.cursor.x), int(self.cursor.y), width, height)
+        self.cursor.x += width
+        self.shelf_height = max(self.shelf_height, height)
+        return rect
+    
+    def add(self, key: tuple, tile: pygame.Surface) -> pygame.Rect:
+        rect = self.allocate(tile.get_size())
+        self.surface.blit(tile, rect)
+        self.tiles[key] = rect
+        return rect
+    
+    def square(self, filled: bool, colour: Colour) -> pygame.Rect:
+        key = ("square", filled, colour)
+        if key not in self.tiles:
+            tile = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
+            tile.fill(self.theme.cw_fill if filled else colour)
+            pygame.draw.rect(tile, self.theme.cw_fill, tile.get_rect(), width = max(self.square_size // 30, 1))
+            self.add(key, tile)
+        return self.tiles[key]
+    
+    def text(self, text: str, size: int) -> pygame.Rect:
+        key = ("text", text, size)
+        if key not in self.tiles:
+            self.add(key, self.fonts.get(size).render(text, True, self.theme.cw_text))
+        return self.tiles[key]
+
+def render_raster(layout: PuzzleLayout, theme: AppTheme, dpi: int = 300, answers: bool = False, atlas: TileAtlas | None = None) -> pygame.Surface:
+    if not pygame.font.get_init():
+        pygame.font.init()
+    
+    square_size = max(round(layout.square_size * dpi), 1)
+    if atlas is None or atlas.square_size != square_size:
+        atlas = TileAtlas(square_size, theme, FontCache(theme.cw_font))
+    
+    width, height = layout.size
+    surface = pygame.Surface((round(width * dpi), round(height * dpi)))
+    surface.fill(theme.cw_background)
+    
+    # Tiles are all created before blitting, since growing the atlas replaces its surface.
+    blits = []
+    for square in layout.squares:
+        position = (round(square.x * dpi), round(square.y * dpi))
+        rect = atlas.square(square.filled, square.colour)
+        blits.append((rect, position))
+        
+        if square.filled:
+            continue
+        
+        if answers and square.character:
+            font_size = square_size * 8 // (10 * max(len(square.character), 1))
+            text = atlas.text(square.character, font_size)
+            centre = (position[0] + (square_size - text.width) // 2, position[1] + (square_size - text.height) // 2)
+            blits.append((text, centre))
+        
+        if square.number is not None:
+            number = atlas.text(str(square.number), square_size // 3)
+            blits.append((number, (position[0] + square_size // 15 + 1, position[1] + square_size // 15 + 1)))
+    
+    surface.blits([(atlas.surface, position, rect) for rect, position in blits], doreturn = False)
+    return surface
+
+def save_png(path: pathlib.Path, layout: PuzzleLayout, theme: AppTheme, dpi: int = 300, answers: bool = False, atlas: TileAtlas | None = None):
+    pygame.image.save(render_raster(layout, theme, dpi, answers, atlas), str(path))
+
+def hex_colour(colour: Colour) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*colour)
+
+def render_svg(layout: PuzzleLayout, theme: AppTheme, answers: bool = False) -> str:
+    # Drawn in points, so the document keeps its physical size when converted to PDF.
+    scale = POINTS_PER_INCH
+    size = layout.square_size * scale
+    width, height = (side * scale for side in layout.size)
+    stroke = max(size / 30, 0.5)
+    
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:g}pt" height="{height:g}pt" viewBox="0 0 {width:g} {height:g}">',
+             f'<rect width="100%" height="100%" fill="{hex_colour(theme.cw_background)}"/>',
+             f'<g stroke="{hex_colour(theme.cw_fill)}" stroke-width="{stroke:g}">',
+             ]
+    for square in layout.squares:
+        colour = theme.cw_fill if square.filled else square.colour
+        lines.append(f'<rect x="{square.x * scale:g}" y="{square.y * scale:g}" width="{size:g}" height="{size:g}" fill="{hex_colour(colour)}"/>')
+    lines.append("</g>")
+    
+    lines.append(f'<g font-family="{escape(theme.cw_font)}" fill="{hex_colour(theme.cw_text)}">')
+    for square in layout.squares:
+        if square.filled:
+            continue
+        x, y = square.x * scale, square.y * scale
+        
+        if square.number is not None:
+            lines.append(f'<text x="{x + size / 15:g}" y="{y + size / 15:g}" font-size="{size / 3:g}" dominant-baseline="hanging">{square.number}</text>')
+        if answers and square.character:
+            font_size = size * 0.8 / max(len(square.character), 1)
+            lines.append(f'<text x="{x + size / 2:g}" y="{y + size / 2:g}" font-size="{font_size:g}" text-anchor="middle" dominant-baseline="central">{escape(square.character)}</text>')
+    lines.append("</g>")
+    
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
+
+def save_svg(path: pathlib.Path, layout: PuzzleLayout, theme: AppTheme, answers: bool = False):
+    with open(path, "w", encoding = "utf-8") as file:
+        file.write(render_svg(layout, theme, answers))
\ No newline at end of file
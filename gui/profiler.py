@@ -0,0 +1,157 @@
+from collections import deque
+from gui.app_theme import AppTheme
+from gui.crossword_square import FontCache
+
+import contextlib, json, os, pathlib, statistics, threading, time
+import pygame
+
+# Upper bounds of the frame time histogram buckets, in milliseconds. The last bucket is open.
+HISTOGRAM_BOUNDS = (4, 8, 16.7, 33.3, 50, 100)
+NULL_STAGE = contextlib.nullcontext()
+
+class Stage:
+    __slots__ = ("profiler", "name", "start")
+    
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+    
+    def __exit__(self, *exception):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+
+class Profiler:
+    # Times named stages of each frame. While disabled, `stage` hands back a shared no-op context,
+    # so instrumented code costs one method call. Safe to record from the word lookup thread.
+    def __init__(self, enabled: bool = False, history: int = 600, trace_size: int = 200_000):
+        self.enabled = enabled
+        self.history = history
+        self.start_time = time.perf_counter()
+        self.durations: dict[str, deque[float]] = {}
+        self.events: deque[tuple[str, float, float, int]] = deque(maxlen = trace_size) # Name, start, duration, thread
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.frame_start: float | None = None
+        self.lock = threading.Lock()
+    
+    def stage(self, name: str) -> Stage | contextlib.nullcontext:
+        return Stage(self, name) if self.enabled else NULL_STAGE
+    
+    def record(self, name: str, start: float, duration: float):
+        with self.lock:
+            if name not in self.durations:
+                self.durations[name] = deque(maxlen = self.history)
+            self.durations[name].append(duration)
+            self.events.append((name, start, duration, threading.get_ident()))
+    
+    def begin_frame(self):
+        self.frame_start = time.perf_counter() if self.enabled else None
+    
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        
+        duration = time.perf_counter() - self.frame_start
+        self.record("frame", self.frame_start, duration)
+        
+        milliseconds = duration * 1000
+        bucket = next((index for index, bound in enumerate(HISTOGRAM_BOUNDS) if milliseconds < bound), len(HISTOGRAM_BOUNDS))
+        self.histogram[bucket] += 1
+    
+    def reset(self):
+        with self.lock:
+            self.durations.clear()
+            self.events.clear()
+            self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    
+    def summary(self) -> dict[str, dict[str, float]]:
+        # Milliseconds over the last `history` samples of each stage.
+        with self.lock:
+            samples = {name: sorted(durations) for name, durations in self.durations.items() if durations}
+        
+        return {name: {"count": len(durations),
+                       "mean": statistics.fmean(durations) * 1000,
+                       "p95": durations[int(0.95 * (len(durations) - 1))] * 1000,
+                       "max": durations[-1] * 1000,
+                       } for name, durations in samples.items()}
+    
+    def histogram_labels(self) -> list[str]:
+        return [f"<{bound:g}ms" for bound in HISTOGRAM_BOUNDS] + [f">={HISTOGRAM_BOUNDS[-1]:g}ms"]
+    
+    def dump(self, path: pathlib.Path):
+        # Chrome trace format (chrome://tracing, Perfetto), with the summary and histogram alongside.
+        with self.lock:
+            events = list(self.events)
+        
+        threads = {thread: index for index, thread in enumerate(dict.fromkeys(thread for *_, thread in events))}
+        trace = {
+            "traceEvents": [{"name": name,
+                             "ph": "X",
+                             "ts": (start - self.start_time) * 1e6,
+                             "dur": duration * 1e6,
+                             "pid": os.getpid(),
+                             "tid": threads[thread],
+                             } for name, start, duration, thread in events],
+            "displayTimeUnit": "ms",
+            "summary": self.summary(),
+            "histogram": dict(zip(self.histogram_labels(), self.histogram)),
+        }
+        
+        with open(path, "w", encoding = "utf-8") as file:
+            json.dump(trace, file)
+
+class ProfilerHUD:
+    # Stage timings and the frame histogram drawn in a corner of the window.
+    # The text is re-rendered a few times a second rather than every frame.
+    def __init__(self, profiler: Profiler, theme: AppTheme, font_size: int = 18, refresh_interval: float = 0.25):
+        self.profiler = profiler
+        self.theme = theme
+        self.fonts = FontCache(theme.cw_font)
+        self.font_size = font_size
+        self.refresh_interval = refresh_interval
+        self.visible = False
+        self.enabled_profiler = False # Whether showing the HUD turned profiling on, to turn it off again on hiding
+        self.panel: pygame.Surface | None = None
+        self.rendered_at = 0.0
+    
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            self.enabled_profiler = not self.profiler.enabled
+            self.profiler.enabled = True
+        elif self.enabled_profiler:
+            self.profiler.enabled = self.enabled_profiler = False
+        self.panel = None
+    
+    def lines(self) -> list[str]:
+        summary = self.profiler.summary()
+        frame = summary.get("frame")
+        
+        lines = [f"{1000 / frame['mean']:.0f} fps, {frame['mean']:.1f}ms mean, {frame['p95']:.1f}ms p95" if frame else "No frames yet"]
+        lines += [f"{name:<18} {stats['mean']:7.2f} {stats['p95']:7.2f} {stats['max']:7.2f}" for name, stats in summary.items() if name != "frame"]
+        
+        total = sum(self.profiler.histogram) or 1
+        lines += [f"{label:>8} {'#' * round(20 * count / total)} {count}" for label, count in zip(self.profiler.histogram_labels(), self.profiler.histogram)]
+        return lines
+    
+    def render(self) -> pygame.Surface:
+        font = self.fonts.get(self.font_size)
+        rendered = [font.render(line, True, self.theme.app_text) for line in self.lines()]
+        
+        panel = pygame.Surface((max(text.get_width() for text in rendered) + 10, len(rendered) * font.get_linesize() + 10), pygame.SRCALPHA)
+        panel.fill((*self.theme.app_background, 220))
+        for index, text in enumerate(rendered):
+            panel.blit(text, (5, 5 + index * font.get_linesize()))
+        return panel
+    
+    def draw(self, surface: pygame.Surface):
+        if not self.visible:
+            return
+        
+        now = time.perf_counter()
+        if self.panel is None or now - self.rendered_at > self.refresh_interval:
+            self.panel = self.render()
+            self.rendered_at = now
+        
+        surface.blit(self.panel, self.panel.get_rect(bottomright = surface.get_rect().bottomright))
\ No newline at end of file
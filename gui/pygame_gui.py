@@ -1,12 +1,24 @@
 from editor import CrosswordEditor, EditorModes
 from matrix import Matrix, SquareContents
-from word_filter import create_filter
-from gui.crossword_square import RenderedMatrix
+from word_filter import WordStore, WordFilter, RankedMatches, create_filter
+from dictionary_cache import DictionaryLoader
+from slots import Direction, SlotIndex
+from document import CrosswordDocument, Clues, Autosaver, autosave_path, load_document, save_document
+from exporter import discover_exporters
+from history import History, Command, Region, SetCharacter, ToggleFill, PasteRegion, copy_region
+from viability import CrossingChecker, CrossingQuery, ViableMatches, crossing_query
+from pattern_query import PatternQuery, MergedMatches, parse_query
+from grid_health import GridHealth, HealthReport
+from gui.crossword_square import RenderedMatrix, Overlay, FontCache, GlyphCache
+from gui import word_lookup
+from gui import autofill_worker
+from gui.profiler import Profiler, ProfilerHUD
 from gui.app_theme import AppTheme
 from gui.cursor import Cursor
 
-from dataclasses import dataclass, field
-import pygame
+import pygame, os, pathlib, time
+
+CANDIDATE_PAGE_SIZE = 64 # Candidates ranked by the lookup thread before the results are shown
 
 FILL_MODES = [EditorModes.FILL, EditorModes.FILL_ASYMMETRICAL]
 TYPING_MODES = [EditorModes.NORMAL, EditorModes.REBUS, EditorModes.HINTS, EditorModes.FILTER]
@@ -59,24 +71,50 @@ def find_cursor_words(matrix: Matrix, position: tuple[int, int]) -> tuple[str, s
     
     return row_string, column_string
 
-@dataclass
-class PreviousWord:
-    string: str = ""
-    results: dict[str, list[str]] = field(default_factory = dict)
-
 class PygameGUI(CrosswordEditor):
-    def __init__(self, dictionaries: dict[str, list[str]]):
+    def __init__(self, dictionaries: dict[str, list[str]] | WordStore | DictionaryLoader, document_path: pathlib.Path | None = None, history_size: int = 10_000, started: float | None = None):
+        self.started = time.perf_counter() if started is None else started # Time to first frame is measured from here
+        self.first_frame: float | None = None
         self.theme = AppTheme()
         
-        self.find_all_words = create_filter(dictionaries)
+        # The dictionaries are loaded and indexed on their own thread while the window opens.
+        # Until they are in, lookups wait on the lookup thread and the word list shows progress.
+        self.dictionaries = dictionaries if isinstance(dictionaries, DictionaryLoader) else DictionaryLoader(lambda progress: create_filter(dictionaries).store)
+        self.find_all_words: WordFilter | None = None
+        self.word_store: WordStore | None = None # Every dictionary's words once, also used by autofill
+        self.crossing_checker: CrossingChecker | None = None # Only used on the lookup thread
         self.matrix = Matrix(11, 11, self.theme.cw_background)
+        self.clues: Clues = {}
+        self.metadata: dict[str, str] = {}
+        self.document_path = document_path or pathlib.Path("untitled.cwd")
+        if self.document_path.exists():
+            self.open_document(self.document_path)
+        # An untitled grid is only autosaved once it has been saved somewhere.
+        self.autosaver = Autosaver(None if document_path is None else autosave_path(document_path), self.current_document)
+        self.history = History(self.matrix, history_size)
+        self.clipboard: Region = ()
         self.cursor = Cursor(edges = self.matrix.dimensions)
+        self.slots = SlotIndex(self.matrix)
+        self.health = GridHealth(self.matrix, self.slots)
         self.mode: EditorModes = EditorModes.NORMAL
         self.start_select: tuple[int, int] = (0, 0)
         
+        # Setting CROSSWORD_PROFILE to a file name profiles from the start and writes a trace there on exit.
+        self.profile_path = os.environ.get("CROSSWORD_PROFILE")
+        self.profiler = Profiler(enabled = bool(self.profile_path))
+        self.profiler_hud = ProfilerHUD(self.profiler, self.theme)
+        
         self.needs_refresh: bool = False
-        self.previous_across = PreviousWord()
-        self.previous_down = PreviousWord()
+        self.word_lookup = word_lookup.WordLookupWorker(self.find_candidates, profiler = self.profiler)
+        self.autofill_worker = autofill_worker.AutofillWorker()
+        self.fill_before: Region = () # The grid when the running fill started
+        self.rank_by_viability = False
+        self.filter_query = ""       # Typed after / in filter mode, in the pattern_query language
+        self.typing_query = False
+        self.across_words: RankedMatches | None = None
+        self.down_words: RankedMatches | None = None
+        self.word_scroll = 0
+        self.word_page_size = 1
         
         
         pygame.init()
@@ -85,52 +123,158 @@ class PygameGUI(CrosswordEditor):
         self.clock = pygame.time.Clock()
         self.running = True
         self.matrix_position = 0 # The crossword renders on the left hand side of the window.
+        self.rendered_matrix = RenderedMatrix(self.matrix, self.screen, self.theme, self.matrix_position)
+        self.highlighted_state: tuple | None = None
+        self.word_glyphs = GlyphCache(FontCache(self.theme.cw_font), limit = 256) # About two screens of candidates
+        self.health_text: tuple[HealthReport, pygame.Surface] | None = None
+        self.dictionaries.when_loaded(self.words_loaded)
+    
+    def words_loaded(self, store: WordStore):
+        # Runs on the loading thread, before anything waiting on the dictionaries is woken.
+        self.find_all_words = create_filter(store)
+        self.crossing_checker = CrossingChecker(store)
+        self.word_store = store
+        self.profiler.record("dictionaries_loaded", self.started, time.perf_counter() - self.started)
+        print(f"Dictionaries loaded after {time.perf_counter() - self.started:.2f}s")
     
     def main_loop(self):
         while self.running:
-            self.handle_events()
+            self.profiler.begin_frame()
+            with self.profiler.stage("handle_events"):
+                self.handle_events()
             if self.needs_refresh:
-                #self.refresh_words()
+                with self.profiler.stage("refresh_words"):
+                    self.refresh_words()
                 self.needs_refresh = False
             self.render_all()
+            self.autosaver.tick()
+            self.profiler.end_frame()
+            if self.first_frame is None:
+                self.first_frame = time.perf_counter() - self.started
+                self.profiler.record("first_frame", self.started, self.first_frame)
+                print(f"First frame after {self.first_frame:.2f}s")
             self.clock.tick(60)
         
+        self.word_lookup.stop()
+        self.autofill_worker.stop()
+        self.autosaver.stop()
+        if self.profile_path:
+            self.profiler.dump(pathlib.Path(self.profile_path))
         pygame.key.stop_text_input()
         pygame.quit()
     
+    def perform(self, command: Command) -> Command:
+        # Every edit goes through here, so the autosaver only hears about real changes.
+        self.autosaver.mark_dirty()
+        return self.history.perform(command)
+    
+    def set_character(self, position: tuple[int, int], character: str):
+        if self.matrix[*position].character != character:
+            self.perform(SetCharacter(position, self.matrix[*position].character, character))
+    
+    def toggle_fill(self, *positions: tuple[int, int]):
+        self.perform(ToggleFill(positions))
+        self.filled_changed(*positions)
+    
+    def filled_changed(self, *positions: tuple[int, int]):
+        for position in positions:
+            self.slots.update(position)
+        self.health.update(*positions)
+    
+    def selection_corner(self) -> tuple[int, int]:
+        return min(self.start_select[0], self.cursor.position()[0]), min(self.start_select[1], self.cursor.position()[1])
+    
     def delete_selection(self):
-        for index in get_all_points(self.start_select, self.cursor.position()):
-            self.matrix[*index].character = " "
+        region = copy_region(self.matrix, self.start_select, self.cursor.position())
+        cleared = tuple(tuple((" ", filled) for _, filled in row) for row in region)
+        self.perform(PasteRegion(self.selection_corner(), region, cleared))
     
-    def fill_until_edge(self, to_highlight: Matrix, delta: int):
-        current_cursor_position = self.cursor.position()
+    def paste(self):
+        if not self.clipboard:
+            return
         
-        while True:
-            to_highlight[*self.cursor.position()].colour = self.theme.highlight
-            if not self.cursor.shift_if(delta, lambda x, y: not to_highlight[x, y].filled):
-                break
+        rows, columns = self.matrix.dimensions
+        row, column = self.cursor.position()
+        # Clipped to the grid, so undoing restores exactly what was overwritten.
+        pasted = tuple(line[:columns - column] for line in self.clipboard[:rows - row])
+        before = copy_region(self.matrix, (row, column), (row + len(pasted) - 1, column + len(pasted[0]) - 1))
+        command = self.perform(PasteRegion((row, column), before, pasted))
+        self.filled_changed(*command.filled_changes())
+    
+    def edited(self, command: Command | None):
+        # Brings the slot index up to date after undoing or redoing a command.
+        if command is None:
+            return
         
-        self.cursor.row, self.cursor.column = current_cursor_position
+        self.autosaver.mark_dirty()
+        self.filled_changed(*command.filled_changes())
+        self.cursor.row, self.cursor.column = command.position
+        self.needs_refresh = True
     
     def refresh_words(self):
-        across_string, down_string = find_cursor_words(self.matrix, self.cursor.position())
+        across, down = self.slots.slots_at(self.cursor.position())
+        across_string = across.pattern(self.matrix) if across and not self.matrix[*self.cursor.position()].filled else ""
+        down_string = down.pattern(self.matrix) if down and not self.matrix[*self.cursor.position()].filled else ""
         
+        # Rebus squares are spelled out, so patterns have the answer's length, as autofill and the crossing checks read them.
         waste_of_time = lambda word: len(word) < 3 or word.isspace() or word.count(" ") >= 5
         
-        if len(across_string) < 3 or self.previous_across.string != across_string:
-            across_words = {} if waste_of_time(across_string) else self.find_all_words(across_string, " ")
-            self.previous_across = PreviousWord(across_string, across_words)
-        else:
-            across_words = self.previous_across.results
+        across_string = "" if waste_of_time(across_string) else across_string
+        down_string = "" if waste_of_time(down_string) else down_string
+        
+        # In filter mode candidates are also checked against the entries crossing them, and a typed query
+        # replaces the entry in the cursor's direction.
+        if self.mode == EditorModes.FILTER:
+            across_string = crossing_query(self.matrix, self.slots, across) if across_string else ""
+            down_string = crossing_query(self.matrix, self.slots, down) if down_string else ""
+            query = self.parsed_query()
+            if query is not None and self.cursor.going_down:
+                down_string = query
+            elif query is not None:
+                across_string = query
         
-        if len(down_string) < 3 or self.previous_down.string != down_string:
-            down_words = {} if waste_of_time(down_string) else self.find_all_words(down_string, " ")
-            self.previous_down = PreviousWord(down_string, down_words)
+        # Lookups run on the worker thread and come back as a WORDS_FOUND event.
+        if across_string or down_string:
+            self.word_lookup.submit(across_string, down_string)
         else:
-            down_words = self.previous_down.results
+            self.word_lookup.cancel()
+            self.across_words, self.down_words = None, None
+    
+    def parsed_query(self) -> PatternQuery | None:
+        if not self.filter_query:
+            return None
+        try:
+            return parse_query(self.filter_query)
+        except ValueError as error:
+            pygame.display.set_caption(f"Query: {self.filter_query} ({error})")
+            return None
+    
+    def find_candidates(self, pattern: str | CrossingQuery | PatternQuery, replace_char: str) -> RankedMatches | MergedMatches | None:
+        # Runs on the lookup thread. Later pages are ranked as the list is scrolled.
+        if self.dictionaries.wait() is None:
+            return None # Loading failed, which the word list shows
         
-        print(across_words)
+        if isinstance(pattern, CrossingQuery):
+            candidates = self.crossing_checker.candidates(pattern, self.rank_by_viability)
+        elif isinstance(pattern, PatternQuery):
+            candidates = self.find_all_words.search(pattern)
+        else:
+            candidates = self.find_all_words.ranked(pattern, replace_char)
+        candidates.page(0, CANDIDATE_PAGE_SIZE)
+        return candidates
+    
+    def receive_words(self, event: pygame.event.Event):
+        if not self.word_lookup.is_current(event.generation):
+            return
         
+        self.across_words, self.down_words = event.across, event.down
+        self.word_scroll = 0
+        if event.error is not None:
+            pygame.display.set_caption(f"Word lookup failed: {event.error}")
+    
+    def scroll_words(self, lines: int):
+        longest = max(len(self.across_words or ()), len(self.down_words or ()))
+        self.word_scroll = max(0, min(self.word_scroll + lines, longest - 1))
     
     def handle_events(self):
         for event in pygame.event.get():
@@ -139,6 +283,17 @@ class PygameGUI(CrosswordEditor):
                     self.running = False
                 case pygame.KEYDOWN:
                     self.handle_key(event)
+                case word_lookup.WORDS_FOUND:
+                    self.receive_words(event)
+                case autofill_worker.FILL_PROGRESS:
+                    pygame.display.set_caption(f"Filling... {event.progress.elapsed:.1f}s, {event.progress.nodes} nodes")
+                case autofill_worker.FILL_FINISHED:
+                    self.fill_finished(event)
+                case pygame.MOUSEWHEEL:
+                    if pygame.mouse.get_pos()[0] > min(*self.screen.get_size()):
+                        self.scroll_words(-3 * event.y)
+                    else:
+                        self.rendered_matrix.scroll(-event.y, event.x)
     
     def handle_key(self, event: pygame.event.Event):
         can_type = self.mode in [EditorModes.NORMAL, EditorModes.REBUS]
@@ -151,21 +306,29 @@ class PygameGUI(CrosswordEditor):
         
         if can_type and not ctrl_pressed and typed_letter:
             if in_normal_mode:
-                self.matrix[*self.cursor.position()].character = event.dict["unicode"]
+                self.set_character(self.cursor.position(), event.dict["unicode"])
                 self.cursor.shift_if(1, square_not_filled)
             else:
-                if self.matrix[*self.cursor.position()].character.isspace():
-                    self.matrix[*self.cursor.position()].character = ""
-                    
-                self.matrix[*self.cursor.position()].character += event.dict["unicode"]
-                
+                character = self.matrix[*self.cursor.position()].character
+                self.set_character(self.cursor.position(), ("" if character.isspace() else character) + event.dict["unicode"])
+            
             self.needs_refresh = True
             return
 
         if ctrl_pressed:
             self.handle_ctrl_keys(event)
             return
-
+        
+        if self.typing_query and self.handle_query_key(event):
+            return
+        
+        if self.mode == EditorModes.FILTER and event.dict["unicode"] == "/":
+            self.typing_query = True
+            self.filter_query = ""
+            pygame.display.set_caption("Query: ")
+            self.needs_refresh = True
+            return
+        
         if event.dict["unicode"] == "#":
             self.mode = EditorModes.FILL
             return
@@ -174,7 +337,9 @@ class PygameGUI(CrosswordEditor):
             case pygame.K_ESCAPE:
                 if not in_normal_mode:
                     self.mode = EditorModes.NORMAL
-                    
+                    self.filter_query = ""
+                    self.needs_refresh = True
+            
             # Switching modes
             
             case pygame.K_F1:
@@ -199,24 +364,33 @@ class PygameGUI(CrosswordEditor):
                 
                 has_multiple_characters = len(self.matrix[*self.cursor.position()].character) > 1
                 if has_multiple_characters:
-                    self.matrix[*self.cursor.position()].character = self.matrix[*self.cursor.position()].character[:-1]
+                    self.set_character(self.cursor.position(), self.matrix[*self.cursor.position()].character[:-1])
                 else:
-                    self.matrix[*self.cursor.position()].character = " "
+                    self.set_character(self.cursor.position(), " ")
             
             case pygame.K_DELETE:
                 if self.mode == EditorModes.SELECT:
                     self.delete_selection()
                     return
                 
-                self.matrix[*self.cursor.position()].character = " "
-                
+                self.set_character(self.cursor.position(), " ")
+            
             # Movement
             
             case pygame.K_TAB:
                 self.cursor.going_down = not self.cursor.going_down
+            case pygame.K_PAGEDOWN:
+                self.scroll_words(self.word_page_size)
+            case pygame.K_PAGEUP:
+                self.scroll_words(-self.word_page_size)
             case pygame.K_f:
                 if self.mode == EditorModes.FILL:
                     self.cursor.row, self.cursor.column = mirror(self.cursor.position(), self.matrix.dimensions)
+            case pygame.K_o:
+                if self.mode == EditorModes.FILTER:
+                    # Order candidates by score or by how much room they leave the crossing entries.
+                    self.rank_by_viability = not self.rank_by_viability
+                    self.needs_refresh = True
             
             case pygame.K_UP:
                 if in_normal_mode:
@@ -257,13 +431,16 @@ class PygameGUI(CrosswordEditor):
             # Filling in squares
             
             case pygame.K_SPACE | pygame.K_RETURN:
-                if self.mode in FILL_MODES:
-                    self.matrix[*self.cursor.position()].filled = not self.matrix[*self.cursor.position()].filled
                 if self.mode == EditorModes.FILL:
+                    # The square and its mirror are one edit, so they are undone together.
                     mirrored_position = mirror(self.cursor.position(), self.matrix.dimensions)
-                    if mirrored_position == self.cursor.position(): return
-                    self.matrix[*mirrored_position].filled = not self.matrix[*mirrored_position].filled
+                    if mirrored_position == self.cursor.position():
+                        self.toggle_fill(self.cursor.position())
+                    else:
+                        self.toggle_fill(self.cursor.position(), mirrored_position)
                     return
+                if self.mode == EditorModes.FILL_ASYMMETRICAL:
+                    self.toggle_fill(self.cursor.position())
                 
                 if self.mode in TYPING_MODES:
                     print("TODO: toggle between hints (like hitting tab on nyt)")
@@ -273,6 +450,26 @@ class PygameGUI(CrosswordEditor):
             case _:
                 print("Unknown key: " + str(event.dict))
     
+    def handle_query_key(self, event: pygame.event.Event) -> bool:
+        # While a query is typed, printable keys edit it; Enter keeps it and Escape drops it.
+        # Returns False for keys left to the editor, such as the arrows.
+        match event.dict["key"]:
+            case pygame.K_RETURN | pygame.K_KP_ENTER:
+                self.typing_query = False
+            case pygame.K_ESCAPE:
+                self.typing_query = False
+                self.filter_query = ""
+            case pygame.K_BACKSPACE:
+                self.filter_query = self.filter_query[:-1]
+            case _ if event.dict["unicode"].isprintable() and event.dict["unicode"]:
+                self.filter_query += event.dict["unicode"]
+            case _:
+                return False
+        
+        pygame.display.set_caption(f"Query: {self.filter_query}" if self.filter_query or self.typing_query else "Filter")
+        self.needs_refresh = True
+        return True
+    
     def handle_ctrl_keys(self, event: pygame.event.Event):
         square_not_filled = lambda x, y: not self.matrix[x, y].filled
         square_is_filled = lambda x, y: self.matrix[x, y].filled
@@ -281,11 +478,25 @@ class PygameGUI(CrosswordEditor):
             # Common shortcuts
 
             case pygame.K_c:
-                pass
+                if self.mode == EditorModes.SELECT:
+                    self.clipboard = copy_region(self.matrix, self.start_select, self.cursor.position())
             case pygame.K_x:
-                pass
+                if self.mode == EditorModes.SELECT:
+                    self.clipboard = copy_region(self.matrix, self.start_select, self.cursor.position())
+                    self.delete_selection()
             case pygame.K_v:
-                pass
+                if self.mode == EditorModes.SELECT:
+                    self.cursor.row, self.cursor.column = self.selection_corner()
+                    self.mode = EditorModes.NORMAL
+                self.paste()
+                self.needs_refresh = True
+            case pygame.K_z:
+                if event.dict["mod"] & pygame.KMOD_SHIFT:
+                    self.edited(self.history.redo())
+                else:
+                    self.edited(self.history.undo())
+            case pygame.K_y:
+                self.edited(self.history.redo())
             case pygame.K_w:
                 self.running = False
                 
@@ -297,16 +508,41 @@ class PygameGUI(CrosswordEditor):
                 self.mode = EditorModes.REBUS
             case pygame.K_f:
                 self.mode = EditorModes.FILTER
+                self.needs_refresh = True
             case pygame.K_v:
                 self.mode = EditorModes.SELECT
             
             # File options
             
             case pygame.K_s:
-                print("TODO: save crossword here")
+                save_document(self.document_path, self.current_document())
+                self.autosaver.path = autosave_path(self.document_path)
+                pygame.display.set_caption(f"Saved {self.document_path}")
             case pygame.K_e:
-                print("TODO: implement exporters")
-                
+                self.export_all()
+            case pygame.K_a:
+                self.autofill()
+            
+            # Zooming
+            
+            case pygame.K_EQUALS | pygame.K_PLUS | pygame.K_KP_PLUS:
+                self.rendered_matrix.set_zoom(self.rendered_matrix.zoom * 1.25)
+                self.rendered_matrix.follow(self.cursor.position())
+            case pygame.K_MINUS | pygame.K_KP_MINUS:
+                self.rendered_matrix.set_zoom(self.rendered_matrix.zoom / 1.25)
+                self.rendered_matrix.follow(self.cursor.position())
+            case pygame.K_0:
+                self.rendered_matrix.set_zoom(1)
+            
+            # Profiling
+            
+            case pygame.K_p:
+                self.profiler_hud.toggle()
+            case pygame.K_t:
+                trace_path = self.document_path.with_suffix(".trace.json")
+                self.profiler.dump(trace_path)
+                pygame.display.set_caption(f"Wrote profile to {trace_path}")
+            
             # Faster moving
             
             case pygame.K_UP:
@@ -366,27 +602,63 @@ class PygameGUI(CrosswordEditor):
             case _:
                 print("Unknown key: " + str(event.dict))
     
-    def highlight_matrix(self) -> Matrix:
-        highlight = self.matrix.deep_copy()
+    def autofill(self, time_limit: float = 30):
+        # Fills a copy of the grid on the autofill thread; the result comes back as a FILL_FINISHED event.
+        if self.word_store is None:
+            pygame.display.set_caption(self.dictionaries.status())
+            return
+        
+        rows, columns = self.matrix.dimensions
+        if self.autofill_worker.start(self.matrix, self.word_store, time_limit):
+            self.fill_before = copy_region(self.matrix, (0, 0), (rows - 1, columns - 1))
+            pygame.display.set_caption("Filling...")
+        else:
+            pygame.display.set_caption("Already filling")
+    
+    def fill_finished(self, event: pygame.event.Event):
+        if event.result is None:
+            pygame.display.set_caption(f"Autofill failed: {event.error}")
+            return
+        
+        rows, columns = self.matrix.dimensions
+        result = event.result
+        summary = f"{result.status.name.lower()} after {result.nodes} nodes ({result.elapsed:.1f}s)"
+        if copy_region(self.matrix, (0, 0), (rows - 1, columns - 1)) != self.fill_before:
+            # The fill answers the grid as it was, so it is not applied over edits made since.
+            pygame.display.set_caption(f"Autofill: {summary}, discarded as the grid changed")
+            return
+        
+        after = copy_region(event.matrix, (0, 0), (rows - 1, columns - 1))
+        if after != self.fill_before:
+            self.perform(PasteRegion((0, 0), self.fill_before, after))
+        
+        pygame.display.set_caption(f"Autofill: {summary}")
+        self.needs_refresh = True
+    
+    def highlight_state(self) -> tuple:
+        # Everything the highlight overlay depends on.
+        return (self.cursor.position(), self.cursor.going_down, self.mode, self.start_select, self.matrix.dimensions, self.slots.version)
+    
+    def highlight_overlay(self) -> Overlay:
+        highlight: Overlay = {}
         
         match self.mode:
             case EditorModes.NORMAL | EditorModes.REBUS | EditorModes.HINTS | EditorModes.FILTER:
-                if not self.matrix[*self.cursor.position()].filled:
-                    self.fill_until_edge(highlight, 1)
-                    self.fill_until_edge(highlight, -1)
+                direction = Direction.DOWN if self.cursor.going_down else Direction.ACROSS
+                word = self.slots.slot_at(self.cursor.position(), direction)
+                if word is not None and not self.matrix[*self.cursor.position()].filled:
+                    for cell in word.cells:
+                        highlight[cell] = (self.theme.highlight, False)
             case EditorModes.FILL:
                 mirrored_position = mirror(self.cursor.position(), self.matrix.dimensions)
-                highlight[*mirrored_position].colour = self.theme.highlight
-                highlight[*mirrored_position].selected = True
+                highlight[mirrored_position] = (self.theme.highlight, True)
             case EditorModes.SELECT:
                 selected_region = get_all_points(self.start_select, self.cursor.position())
                 for index in selected_region:
-                    highlight[*index].colour = self.theme.highlight
-                    highlight[*index].selected = True
+                    highlight[index] = (self.theme.highlight, True)
         
         if self.mode not in [EditorModes.PREVIEW, EditorModes.HINTS]:
-            highlight[*self.cursor.position()].colour = self.theme.cursor_colour
-            highlight[*self.cursor.position()].selected = True
+            highlight[self.cursor.position()] = (self.theme.cursor_colour, True)
         
         return highlight
     
@@ -394,17 +666,84 @@ class PygameGUI(CrosswordEditor):
         self.screen.fill(self.theme.app_background) # Remove anything on buffer
 
         self.render_crossword()
-        self.render_words()
-    
-        pygame.display.flip()
+        with self.profiler.stage("render_words"):
+            self.render_words()
+            self.render_health()
+        self.profiler_hud.draw(self.screen)
+        
+        with self.profiler.stage("flip"):
+            pygame.display.flip()
     
     def render_crossword(self):
-        highlighted_matrix = self.highlight_matrix()
-        RenderedMatrix(highlighted_matrix, self.screen, self.theme, self.matrix_position).draw()
-
-    def render_words(self):
-        pass
-
+        # The overlay is only rebuilt when the cursor, mode or selection changes.
+        state = self.highlight_state()
+        if state != self.highlighted_state:
+            self.highlighted_state = state
+            with self.profiler.stage("highlight_overlay"):
+                self.rendered_matrix.overlay = self.highlight_overlay()
+            self.rendered_matrix.preview = self.mode == EditorModes.PREVIEW
+            self.rendered_matrix.numbers = self.slots.numbers if self.rendered_matrix.preview else {}
+            self.rendered_matrix.matrix = self.matrix
+            self.rendered_matrix.follow(self.cursor.position())
+        
+        self.rendered_matrix.matrix = self.matrix
+        with self.profiler.stage("draw"):
+            self.rendered_matrix.draw()
+    
+    def render_words(self, font_size: int = 24, margin: int = 20):
+        # Across and down candidates are listed in columns to the right of the crossword.
+        # Only the visible page is asked for, so candidates past it are never ranked unless scrolled to.
+        left = min(*self.screen.get_size()) + margin
+        column_width = (self.screen.get_width() - left) // 2
+        bottom = self.screen.get_height() - font_size - margin # Leaves a line for the grid health
+        self.word_page_size = max((bottom - margin) // font_size - 1, 1)
+        
+        if self.word_store is None:
+            self.screen.blit(self.word_glyphs.fonts.get(font_size).render(self.dictionaries.status(), True, self.theme.app_text), (left, margin))
+            return
+        
+        for column, (title, candidates) in enumerate([("Across", self.across_words), ("Down", self.down_words)]):
+            position = pygame.Vector2(left + column * column_width, margin)
+            words = [word for word, _ in candidates.page(self.word_scroll, self.word_scroll + self.word_page_size)] if candidates else []
+            if isinstance(candidates, ViableMatches):
+                # Alongside the completions left for its most constrained crossing.
+                words = [word if candidates.remaining(word) is None else f"{word} ({candidates.remaining(word)})" for word in words]
+            
+            for text in [title] + words:
+                if position.y + font_size > bottom:
+                    break
+                
+                self.screen.blit(self.word_glyphs.get(text, font_size, self.theme.app_text), position)
+                position.y += font_size
+    
+    def render_health(self, font_size: int = 20, margin: int = 20):
+        # Shown under the word lists, and only re-rendered when a statistic changes.
+        report = self.health.report()
+        if self.health_text is None or self.health_text[0] != report:
+            colour = self.theme.app_text if report.healthy else self.theme.cursor_colour
+            self.health_text = (report, self.word_glyphs.fonts.get(font_size).render(report.summary(), True, colour))
+        
+        self.screen.blit(self.health_text[1], (min(*self.screen.get_size()) + margin, self.screen.get_height() - font_size - margin))
+    
+    def export_all(self):
+        # Runs every exporter found in exporters/, writing next to the document.
+        name = str(self.document_path.with_suffix(""))
+        results = {exporter.name: exporter.export(self, name) for exporter in discover_exporters().values()}
+        failed = [exporter for exporter, succeeded in results.items() if not succeeded]
+        pygame.display.set_caption(f"Exported {len(results) - len(failed)}/{len(results)}" + (f", failed: {', '.join(failed)}" if failed else ""))
+    
+    def current_document(self) -> CrosswordDocument:
+        return CrosswordDocument(self.matrix, self.clues, self.metadata)
+    
+    def open_document(self, path: pathlib.Path):
+        document = load_document(path)
+        self.matrix, self.clues, self.metadata = document.matrix, document.clues, document.metadata
+        self.document_path = path
+    
     def update_dimensions(self, new_rows: int, new_columns: int):
         self.matrix = Matrix(new_rows, new_columns)
-        self.cursor.edges = (new_rows, new_columns)
\ No newline at end of file
+        self.cursor.edges = (new_rows, new_columns)
+        self.slots = SlotIndex(self.matrix)
+        self.health.rebuild(self.matrix, self.slots)
+        self.history.clear(self.matrix)
+        self.autosaver.mark_dirty()
\ No newline at end of file
@@ -0,0 +1,84 @@
+from collections.abc import Callable
+from typing import Any
+from gui.profiler import Profiler
+from dataclasses import dataclass
+import threading, traceback
+import pygame
+
+# Posted when a lookup finishes, with `generation`, `across`, `down` and `error` attributes.
+# `across` and `down` are whatever `find_words` returned, or None for an empty pattern.
+# If `find_words` raised, both are None and `error` is the exception, otherwise it is None.
+# Patterns are usually strings, but can be anything `find_words` accepts.
+WORDS_FOUND = pygame.event.custom_type()
+
+@dataclass
+class LookupRequest:
+    generation: int
+    across: Any
+    down: Any
+
+class WordLookupWorker:
+    # Runs dictionary lookups off the UI thread. Only the newest request is kept: submitting again
+    # replaces one that has not started, and results of a superseded request are never posted.
+    def __init__(self, find_words: Callable[[Any, str], Any], replace_char: str = " ", profiler: Profiler | None = None):
+        self.find_words = find_words
+        self.replace_char = replace_char
+        self.profiler = Profiler() if profiler is None else profiler
+        self.generation = 0
+        self.pending: LookupRequest | None = None
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target = self.run, name = "word lookup", daemon = True)
+        self.thread.start()
+    
+    def submit(self, across: Any, down: Any) -> int:
+        with self.condition:
+            self.generation += 1
+            self.pending = LookupRequest(self.generation, across, down)
+            self.condition.notify()
+            return self.generation
+    
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.pending = None
+    
+    def is_current(self, generation: int) -> bool:
+        return generation == self.generation
+    
+    def lookup(self, pattern: Any) -> Any:
+        if not pattern:
+            return None
+        with self.profiler.stage("query"):
+            return self.find_words(pattern, self.replace_char)
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                request, self.pending = self.pending, None
+            
+            error = None
+            try:
+                across = self.lookup(request.across)
+                if not self.is_current(request.generation):
+                    continue
+                down = self.lookup(request.down)
+            except Exception as exception:
+                # Reported rather than raised, so the thread is still there for the next request.
+                traceback.print_exc()
+                across = down = None
+                error = exception
+            if not self.is_current(request.generation):
+                continue
+            
+            pygame.event.post(pygame.event.Event(WORDS_FOUND, generation = request.generation, across = across, down = down, error = error))
+    
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
\ No newline at end of file
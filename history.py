@@ -0,0 +1,180 @@
+from matrix import Matrix
+from slots import Position
+
+from collections import deque
+from dataclasses import dataclass
+
+# A rectangle of squares as rows of (character, filled).
+Region = tuple[tuple[tuple[str, bool], ...], ...]
+
+@dataclass(frozen = True)
+class SetCharacter:
+    position: Position
+    before: str
+    after: str
+    
+    def apply(self, matrix: Matrix):
+        matrix[*self.position].character = self.after
+    
+    def revert(self, matrix: Matrix):
+        matrix[*self.position].character = self.before
+    
+    def filled_changes(self) -> tuple[Position, ...]:
+        return ()
+
+@dataclass(frozen = True)
+class ToggleFill:
+    # The square and, for symmetrical editing, its mirror. Toggling is its own inverse.
+    positions: tuple[Position, ...]
+    
+    @property
+    def position(self) -> Position:
+        return self.positions[0]
+    
+    def apply(self, matrix: Matrix):
+        for position in self.positions:
+            matrix[*position].filled = not matrix[*position].filled
+    
+    def revert(self, matrix: Matrix):
+        self.apply(matrix)
+    
+    def filled_changes(self) -> tuple[Position, ...]:
+        return self.positions
+
+@dataclass(frozen = True)
+class PasteRegion:
+    position: Position # Top left square
+    before: Region
+    after: Region
+    
+    def write(self, matrix: Matrix, region: Region):
+        rows, columns = matrix.dimensions
+        for row_offset, row in enumerate(region):
+            for column_offset, (character, filled) in enumerate(row):
+                row_index, column_index = self.position[0] + row_offset, self.position[1] + column_offset
+                if row_index < rows and column_index < columns:
+                    matrix[row_index, column_index].character = character
+                    matrix[row_index, column_index].filled = filled
+    
+    def apply(self, matrix: Matrix):
+        self.write(matrix, self.after)
+    
+    def revert(self, matrix: Matrix):
+        self.write(matrix, self.before)
+    
+    def filled_changes(self) -> tuple[Position, ...]:
+        return tuple((self.position[0] + row_offset, self.position[1] + column_offset)
+                     for row_offset, (before, after) in enumerate(zip(self.before, self.after))
+                     for column_offset, (old, new) in enumerate(zip(before, after)) if old[1] != new[1])
+
+Command = SetCharacter | ToggleFill | PasteRegion
+
+def copy_region(matrix: Matrix, start: Position, end: Position) -> Region:
+    # Inclusive of both corners, clipped to the grid.
+    rows, columns = matrix.dimensions
+    top, bottom = sorted((start[0], end[0]))
+    left, right = sorted((start[1], end[1]))
+    return tuple(tuple((matrix[row, column].character, matrix[row, column].filled) for column in range(left, min(right + 1, columns)))
+                 for row in range(top, min(bottom + 1, rows)))
+
+@dataclass(frozen = True)
+class Snapshot:
+    filled: bytes
+    characters: tuple[str, ...] # Shares the strings of the grid it was taken from
+    
+    @staticmethod
+    def take(matrix: Matrix) -> "Snapshot":
+        squares = [square for row in matrix.contents for square in row]
+        return Snapshot(bytes(square.filled for square in squares), tuple(square.character for square in squares))
+    
+    def restore(self, matrix: Matrix):
+        columns = matrix.dimensions[1]
+        for index, (filled, character) in enumerate(zip(self.filled, self.characters)):
+            square = matrix[divmod(index, columns)]
+            square.filled = bool(filled)
+            square.character = character
+
+class History:
+    # Undo and redo as a log of small commands, so each edit costs the same no matter the grid size.
+    # A snapshot is taken every `snapshot_interval` edits, so jumping to any point replays at most
+    # that many commands. The oldest edits are forgotten past `max_edits`.
+    def __init__(self, matrix: Matrix, max_edits: int = 10_000, snapshot_interval: int = 250):
+        self.max_edits = max_edits
+        self.snapshot_interval = snapshot_interval
+        self.clear(matrix)
+    
+    def clear(self, matrix: Matrix):
+        self.matrix = matrix
+        self.commands: deque[Command] = deque()
+        self.start = 0    # Number of edits forgotten so far; states are numbered from the first edit ever made
+        self.position = 0 # The state the grid is in now
+        self.snapshots: dict[int, Snapshot] = {0: Snapshot.take(matrix)}
+    
+    @property
+    def end(self) -> int:
+        return self.start + len(self.commands)
+    
+    def can_undo(self) -> bool:
+        return self.position > self.start
+    
+    def can_redo(self) -> bool:
+        return self.position < self.end
+    
+    def perform(self, command: Command) -> Command:
+        command.apply(self.matrix)
+        self.record(command)
+        return command
+    
+    def record(self, command: Command):
+        # For commands that were already applied to the grid.
+        if self.end > self.position:
+            # A new edit after undoing forgets the undone edits.
+            while self.end > self.position:
+                self.commands.pop()
+            self.snapshots = {state: snapshot for state, snapshot in self.snapshots.items() if state <= self.position}
+        
+        self.commands.append(command)
+        self.position += 1
+        if self.position % self.snapshot_interval == 0:
+            self.snapshots[self.position] = Snapshot.take(self.matrix)
+        
+        if len(self.commands) > self.max_edits:
+            while len(self.commands) > self.max_edits:
+                self.commands.popleft()
+                self.start += 1
+            self.snapshots = {state: snapshot for state, snapshot in self.snapshots.items() if state >= self.start}
+    
+    def undo(self) -> Command | None:
+        if not self.can_undo():
+            return None
+        self.position -= 1
+        command = self.commands[self.position - self.start]
+        command.revert(self.matrix)
+        return command
+    
+    def redo(self) -> Command | None:
+        if not self.can_redo():
+            return None
+        command = self.commands[self.position - self.start]
+        command.apply(self.matrix)
+        self.position += 1
+        return command
+    
+    def jump(self, state: int) -> bool:
+        # Moves to any remembered state. Returns True if the grid was restored from a snapshot,
+        # in which case anything derived from the whole grid needs rebuilding.
+        state = max(self.start, min(state, self.end))
+        nearest = min((snapshot for snapshot in self.snapshots if snapshot <= state), key = lambda snapshot: state - snapshot, default = None)
+        
+        if nearest is not None and state - nearest < abs(state - self.position):
+            self.snapshots[nearest].restore(self.matrix)
+            self.position = nearest
+            while self.position < state:
+                self.redo()
+            return True
+        
+        while self.position > state:
+            self.undo()
+        while self.position < state:
+            self.redo()
+        return False
\ No newline at end of file
@@ -1,4 +1,5 @@
 from typing import *
+from array import array
 from copy import deepcopy
 from dataclasses import dataclass
 
@@ -35,4 +36,138 @@ class Matrix:
     
     def __setitem__(self, indices: tuple, value):
         row, column = indices
-        self.contents[row][column] = value
\ No newline at end of file
+        self.contents[row][column] = value
+
+# Characters are stored as code points; anything that is not a single character (rebus squares,
+# or the empty square REBUS mode starts from) lives in a side table keyed by square index.
+SIDE_TABLE = 0xFFFFFFFF
+
+class GridStorage:
+    def __init__(self, size: int):
+        self.filled = bytearray(size)
+        self.selected = bytearray(size)
+        self.colours = array("H", bytes(2 * size))   # Indices into the palette
+        self.characters = array("I", [ord(" ")]) * size
+        self.strings: dict[int, str] = {}
+        self.references = 1
+    
+    def copy(self) -> Self:
+        copied = GridStorage(0)
+        copied.filled = self.filled[:]
+        copied.selected = self.selected[:]
+        copied.colours = self.colours[:]
+        copied.characters = self.characters[:]
+        copied.strings = dict(self.strings)
+        return copied
+
+class SquareView:
+    # Reads and writes one square of a CompactMatrix, standing in for SquareContents.
+    __slots__ = ("matrix", "index")
+    
+    def __init__(self, matrix: "CompactMatrix", index: int):
+        self.matrix = matrix
+        self.index = index
+    
+    @property
+    def character(self) -> str:
+        storage = self.matrix.storage
+        code = storage.characters[self.index]
+        return storage.strings[self.index] if code == SIDE_TABLE else chr(code)
+    
+    @character.setter
+    def character(self, value: str):
+        storage = self.matrix.writable()
+        if len(value) == 1:
+            storage.characters[self.index] = ord(value)
+            storage.strings.pop(self.index, None)
+        else:
+            storage.characters[self.index] = SIDE_TABLE
+            storage.strings[self.index] = value
+    
+    @property
+    def filled(self) -> bool:
+        return bool(self.matrix.storage.filled[self.index])
+    
+    @filled.setter
+    def filled(self, value: bool):
+        self.matrix.writable().filled[self.index] = bool(value)
+    
+    @property
+    def selected(self) -> bool:
+        return bool(self.matrix.storage.selected[self.index])
+    
+    @selected.setter
+    def selected(self, value: bool):
+        self.matrix.writable().selected[self.index] = bool(value)
+    
+    @property
+    def colour(self) -> tuple[int, int, int]:
+        return self.matrix.palette[self.matrix.storage.colours[self.index]]
+    
+    @colour.setter
+    def colour(self, value: tuple[int, int, int]):
+        colour_index = self.matrix.colour_index(value)
+        self.matrix.writable().colours[self.index] = colour_index
+    
+    def __str__(self):
+        return self.character
+    
+    def __eq__(self, other):
+        return (self.colour, self.character, self.filled, self.selected) == (other.colour, other.character, other.filled, other.selected)
+
+class CompactMatrix:
+    # Same interface as Matrix, but backed by flat arrays. Copies share those arrays until one side writes.
+    def __init__(self, rows: int, columns: int, colour: tuple[int, int, int] = (255, 255, 255)):
+        self.dimensions = (rows, columns)
+        self.storage = GridStorage(rows * columns)
+        self.palette: list[tuple[int, int, int]] = [tuple(colour)]
+        self.palette_indices: dict[tuple[int, int, int], int] = {tuple(colour): 0}
+    
+    def colour_index(self, colour: tuple[int, int, int]) -> int:
+        colour = tuple(colour)
+        if colour not in self.palette_indices:
+            # The palette only ever grows, so clones can keep sharing it.
+            self.palette_indices[colour] = len(self.palette)
+            self.palette.append(colour)
+        return self.palette_indices[colour]
+    
+    def writable(self) -> GridStorage:
+        if self.storage.references > 1:
+            self.storage.references -= 1
+            self.storage = self.storage.copy()
+        return self.storage
+    
+    def deep_copy(self) -> Self:
+        cloned_matrix = CompactMatrix.__new__(CompactMatrix)
+        cloned_matrix.dimensions = self.dimensions
+        cloned_matrix.storage = self.storage
+        cloned_matrix.palette = self.palette
+        cloned_matrix.palette_indices = self.palette_indices
+        self.storage.references += 1
+        return cloned_matrix
+    
+    def index(self, row: int, column: int) -> int:
+        rows, columns = self.dimensions
+        if not (-rows <= row < rows and -columns <= column < columns):
+            raise IndexError((row, column))
+        return (row % rows) * columns + column % columns
+    
+    @property
+    def contents(self) -> list[list[SquareView]]:
+        return [self.get_row(row) for row in range(self.dimensions[0])]
+    
+    def get_row(self, index: int) -> list[SquareView]:
+        return [self[index, column] for column in range(self.dimensions[1])]
+    
+    def get_column(self, index: int) -> list[SquareView]:
+        return [self[row, index] for row in range(self.dimensions[0])]
+    
+    def __getitem__(self, indices: tuple) -> SquareView:
+        return SquareView(self, self.index(*indices))
+    
+    def __setitem__(self, indices: tuple, value: SquareContents | SquareView):
+        square = self[indices]
+        square.colour = value.colour
+        square.character = value.character
+        square.filled = value.filled
+        square.selected = value.selected
\ No newline at end of file
@@ -0,0 +1,254 @@
+import os, sys, pathlib, argparse, heapq, itertools, threading
+
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from functools import cache
+
+from word_filter import WordIndex, WordStore, RankedMatches, PostingKey, is_word_character
+
+VOWELS = frozenset("AEIOU")
+
+@dataclass(frozen = True)
+class Square:
+    # A square of a pattern: one of `alternatives` spelled out (a letter, or several for a rebus),
+    # or with no alternatives, any one letter in `include` (None for any) and not in `exclude`.
+    alternatives: tuple[str, ...] = ()
+    include: frozenset[str] | None = None
+    exclude: frozenset[str] = frozenset()
+    vowels: bool | None = None # True for vowels only, False for consonants only
+    
+    def allows(self, letter: str) -> bool:
+        if not is_word_character(letter) or letter in self.exclude:
+            return False
+        if self.include is not None and letter not in self.include:
+            return False
+        if self.vowels is None:
+            return True
+        return letter.upper() in VOWELS if self.vowels else letter.isalpha() and letter.upper() not in VOWELS
+
+# A letter spelled out at a position, or the square choosing one.
+Term = str | Square
+
+@dataclass(frozen = True)
+class PatternQuery:
+    squares: tuple[Square, ...]
+    contains: tuple[str, ...] = ()           # Letters that must appear, once for each time they must,
+    excludes: frozenset[str] = frozenset()   # and letters that must not appear anywhere, both upper case
+    
+    def spellings(self) -> list[tuple[Term, ...]]:
+        # Every way of spelling the rebus squares out, as one term per letter of the word.
+        choices = [square.alternatives or (square,) for square in self.squares]
+        spellings = {}
+        for choice in itertools.product(*choices):
+            terms = tuple(term for part in choice for term in (part if isinstance(part, str) else (part,)))
+            spellings[terms] = None
+        return list(spellings)
+
+@cache
+def parse_query(text: str, wildcard: str = "?") -> PatternQuery:
+    # `wildcard` is any letter, @ a vowel and # a consonant. [ABC] is one of A, B or C and [^ABC] any
+    # letter but those. (HEART|LOVE) is a rebus square spelled either way, and \ makes the next character
+    # a plain letter. After the squares, +LETTERS must appear in the word and -LETTERS must not, in either
+    # case whatever case they are typed in. Whitespace is ignored unless it is the wildcard.
+    squares = []
+    position = 0
+    
+    def fail(message: str):
+        raise ValueError(f"{message} at {position} in pattern {text!r}")
+    
+    def closing(bracket: str) -> str:
+        nonlocal position
+        end = text.find(bracket, position)
+        if end < 0:
+            fail(f"Missing {bracket}")
+        body, position = text[position:end], end + 1
+        return body
+    
+    while position < len(text) and text[position] not in "+-":
+        character = text[position]
+        position += 1
+        
+        match character:
+            case _ if character == wildcard:
+                squares.append(Square())
+            case "@" | "#":
+                squares.append(Square(vowels = character == "@"))
+            case "\\":
+                if position == len(text):
+                    fail("Nothing to escape")
+                squares.append(Square((text[position],)))
+                position += 1
+            case "[":
+                body = closing("]")
+                if body[:1] in ("^", "!"):
+                    squares.append(Square(exclude = frozenset(body[1:])))
+                elif body:
+                    squares.append(Square(include = frozenset(body)))
+                else:
+                    fail("Empty set")
+            case "(":
+                alternatives = tuple(closing(")").split("|"))
+                if not all(alternatives):
+                    fail("Empty rebus alternative")
+                squares.append(Square(alternatives))
+            case "]" | ")":
+                fail(f"Unmatched {character}")
+            case _ if character.isspace():
+                continue
+            case _:
+                squares.append(Square((character,)))
+    
+    if not squares:
+        fail("No squares")
+    
+    contains, excludes, sign = [], set(), None
+    for character in text[position:]:
+        if character in "+-":
+            sign = character
+        elif character.isspace():
+            continue
+        elif sign == "+":
+            contains.append(character.upper())
+        else:
+            excludes.add(character.upper())
+    
+    return PatternQuery(tuple(squares), tuple(sorted(contains)), frozenset(excludes))
+
+@dataclass
+class QueryPlan:
+    # Posting operations answering one spelling of a query on the bucket of its length.
+    length: int
+    unions: list[list[PostingKey]] = field(default_factory = list) # Words must be in one posting of each
+    excluded: list[PostingKey] = field(default_factory = list)     # and in none of these,
+    counts: dict[str, int] = field(default_factory = dict)         # then hold these letters this many times.
+    
+    def matches(self, index: WordIndex) -> set[int] | None:
+        # None when every word of the length matches.
+        required = [index.posting(*union[0]) if len(union) == 1 else set().union(*(index.posting(*key) for key in union)) for union in self.unions]
+        excluded = [posting for posting in (index.posting(*key) for key in self.excluded) if posting]
+        
+        if not required:
+            if not excluded and not self.counts:
+                return None
+            required.append(set(range(len(index.bucket(self.length)))))
+        
+        required.sort(key = len)
+        matches = required[0].intersection(*required[1:])
+        if excluded:
+            matches = matches.difference(*excluded)
+        if self.counts:
+            bucket = index.bucket(self.length)
+            matches = {match for match in matches if all(bucket[match].upper().count(letter) >= count for letter, count in self.counts.items())}
+        return matches
+
+def plan_spelling(query: PatternQuery, terms: tuple[Term, ...], index: WordIndex) -> QueryPlan | None:
+    # None when nothing can match this spelling.
+    length = len(terms)
+    plan = QueryPlan(length)
+    spelled = Counter(term.upper() for term in terms if isinstance(term, str))
+    if any(letter in query.excludes for letter in spelled):
+        return None
+    
+    for position, term in enumerate(terms):
+        if isinstance(term, str):
+            plan.unions.append([(length, position, term)])
+            continue
+        
+        # A square keeps the words with an allowed letter, or drops those with any other letter,
+        # whichever touches fewer words.
+        letters = index.letters(length, position)
+        allowed, rejected = [], []
+        for letter in letters:
+            (allowed if term.allows(letter) and letter.upper() not in query.excludes else rejected).append((length, position, letter))
+        if not allowed:
+            return None
+        if sum(len(index.posting(*key)) for key in allowed) < sum(len(index.posting(*key)) for key in rejected):
+            plan.unions.append(allowed)
+        else:
+            plan.excluded += rejected
+    
+    open_positions = [position for position, term in enumerate(terms) if not isinstance(term, str)]
+    for letter, count in Counter(query.contains).items():
+        if spelled[letter] >= count:
+            continue
+        union = [(length, position, found) for position in open_positions for found in index.letters(length, position) if found.upper() == letter]
+        if not union:
+            return None
+        plan.unions.append(union)
+        if count - spelled[letter] > 1:
+            plan.counts[letter] = count
+    
+    return plan
+
+def compile_query(query: PatternQuery, index: WordIndex) -> list[QueryPlan]:
+    return [plan for plan in (plan_spelling(query, terms, index) for terms in query.spellings()) if plan is not None]
+
+class MergedMatches:
+    # Ranked matches of several lengths, as rebus alternatives of different sizes give, merged best score first.
+    def __init__(self, parts: list[RankedMatches]):
+        self.parts = parts
+        self.count = sum(len(part) for part in parts)
+        self.order = heapq.merge(*map(self.scored, parts), key = lambda match: -match[1])
+        self.ranked: list[tuple[str, int]] = []
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def scored(part: RankedMatches) -> Iterator[tuple[str, int]]:
+        return ((part.words[index], part.scores[index]) for index in part.order)
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def page(self, start: int, stop: int) -> list[tuple[str, int]]:
+        with self.lock:
+            self.ranked.extend(itertools.islice(self.order, max(stop - len(self.ranked), 0)))
+            return self.ranked[start:stop]
+    
+    def top(self, count: int) -> list[tuple[str, int]]:
+        return self.page(0, count)
+
+def ranked_query(index: WordIndex, query: PatternQuery, sources: int | None = None) -> RankedMatches | MergedMatches:
+    # `sources` is a mask of the dictionaries to include, as WordStore.ranked_words takes.
+    by_length: dict[int, set[int] | None] = {}
+    for plan in compile_query(query, index):
+        matches = plan.matches(index)
+        if plan.length in by_length:
+            earlier = by_length[plan.length]
+            matches = None if matches is None or earlier is None else matches | earlier
+        by_length[plan.length] = matches
+    
+    if isinstance(index, WordStore) and sources is not None and sources != (1 << len(index.names)) - 1:
+        for length, matches in by_length.items():
+            masks = index.bucket_masks(length)
+            by_length[length] = {match for match in (range(len(masks)) if matches is None else matches) if masks[match] & sources}
+    
+    parts = [RankedMatches(index, length, matches) for length, matches in sorted(by_length.items())] or [RankedMatches(index, 0, set())]
+    return parts[0] if len(parts) == 1 else MergedMatches(parts)
+
+def main(arguments: list[str]) -> int:
+    from dictionary_cache import load_word_store
+    
+    parser = argparse.ArgumentParser(description = "List dictionary words matching a pattern, best score first.")
+    parser.add_argument("pattern", help = "e.g. '?@?[^E](HEART|LOVE) +S -XZ'")
+    parser.add_argument("-d", "--dictionaries", type = pathlib.Path, default = pathlib.Path(os.path.dirname(os.path.abspath(__file__)), "dictionaries"))
+    parser.add_argument("-n", "--count", type = int, default = 50, help = "Matches to list (default: 50)")
+    parser.add_argument("-w", "--wildcard", default = "?", help = "Character matching any letter (default: ?)")
+    parser.add_argument("-s", "--source", action = "append", dest = "sources", help = "Only words from this dictionary, may be repeated")
+    options = parser.parse_args(arguments)
+    
+    try:
+        query = parse_query(options.pattern, options.wildcard)
+    except ValueError as error:
+        parser.error(str(error))
+    
+    store = load_word_store(options.dictionaries)
+    matches = ranked_query(store, query, None if options.sources is None else store.source_mask(options.sources))
+    for word, score in matches.top(options.count):
+        print(f"{score:>4}  {word}")
+    print(f"{len(matches)} matches")
+    
+    return 0 if len(matches) else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
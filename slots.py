@@ -0,0 +1,139 @@
+from matrix import Matrix, SquareContents
+
+from dataclasses import dataclass
+from enum import Enum
+import bisect
+
+Position = tuple[int, int]
+
+class Direction(Enum):
+    ACROSS = 1
+    DOWN   = 2
+
+@dataclass
+class Slot:
+    direction: Direction
+    cells: list[Position]
+    
+    def squares(self, matrix: Matrix) -> list[SquareContents]:
+        return [matrix[*cell] for cell in self.cells]
+    
+    def pattern(self, matrix: Matrix) -> str:
+        return "".join(square.character for square in self.squares(matrix))
+
+def find_line_runs(matrix: Matrix, direction: Direction, line: int, minimum_length: int = 2) -> list[Slot]:
+    length = matrix.dimensions[1] if direction == Direction.ACROSS else matrix.dimensions[0]
+    
+    slots = []
+    cells = []
+    for offset in range(length + 1):
+        cell = (line, offset) if direction == Direction.ACROSS else (offset, line)
+        
+        if offset < length and not matrix[*cell].filled:
+            cells.append(cell)
+            continue
+        
+        if len(cells) >= minimum_length:
+            slots.append(Slot(direction, cells))
+        cells = []
+    
+    return slots
+
+def find_runs(matrix: Matrix, direction: Direction, minimum_length: int = 2) -> list[Slot]:
+    lines = matrix.dimensions[0] if direction == Direction.ACROSS else matrix.dimensions[1]
+    return [slot for line in range(lines) for slot in find_line_runs(matrix, direction, line, minimum_length)]
+
+def find_slots(matrix: Matrix, minimum_length: int = 2) -> list[Slot]:
+    return find_runs(matrix, Direction.ACROSS, minimum_length) + find_runs(matrix, Direction.DOWN, minimum_length)
+
+class SlotIndex:
+    # Every across and down entry of a grid, the entries each cell belongs to, and the clue numbers.
+    # Toggling a square only rescans its row and column.
+    def __init__(self, matrix: Matrix, minimum_length: int = 2):
+        self.matrix = matrix
+        self.minimum_length = minimum_length
+        self.lines: dict[tuple[Direction, int], list[Slot]] = {}
+        self.cells: dict[Position, tuple[Slot | None, Slot | None]] = {}
+        self.starts: list[Position] = [] # Numbered squares in reading order
+        self.version = 0
+        self.cached_numbers: dict[Position, int] | None = None
+        self.rebuild()
+    
+    def rebuild(self):
+        rows, columns = self.matrix.dimensions
+        self.cells = {(row, column): (None, None) for row in range(rows) for column in range(columns)}
+        self.lines = {}
+        
+        for row in range(rows):
+            self.scan_line(Direction.ACROSS, row)
+        for column in range(columns):
+            self.scan_line(Direction.DOWN, column)
+        
+        self.starts = sorted({slot.cells[0] for slots in self.lines.values() for slot in slots})
+        self.changed()
+    
+    def scan_line(self, direction: Direction, line: int):
+        previous = self.lines.get((direction, line), [])
+        slots = find_line_runs(self.matrix, direction, line, self.minimum_length)
+        self.lines[direction, line] = slots
+        
+        slot_index = 0 if direction == Direction.ACROSS else 1
+        for slot in previous:
+            for cell in slot.cells:
+                self.set_cell_slot(cell, slot_index, None)
+        for slot in slots:
+            for cell in slot.cells:
+                self.set_cell_slot(cell, slot_index, slot)
+    
+    def set_cell_slot(self, cell: Position, slot_index: int, slot: Slot | None):
+        slots = list(self.cells[cell])
+        slots[slot_index] = slot
+        self.cells[cell] = tuple(slots)
+    
+    def update(self, position: Position):
+        # Call after toggling the filled state of the square at position.
+        row, column = position
+        affected = self.lines[Direction.ACROSS, row] + self.lines[Direction.DOWN, column]
+        
+        self.scan_line(Direction.ACROSS, row)
+        self.scan_line(Direction.DOWN, column)
+        
+        # Only squares in the toggled row and column can gain or lose a number.
+        candidates = {slot.cells[0] for slot in affected}
+        candidates |= {slot.cells[0] for slot in self.lines[Direction.ACROSS, row] + self.lines[Direction.DOWN, column]}
+        for cell in candidates:
+            across, down = self.cells[cell]
+            is_start = (across is not None and across.cells[0] == cell) or (down is not None and down.cells[0] == cell)
+            index = bisect.bisect_left(self.starts, cell)
+            is_listed = index < len(self.starts) and self.starts[index] == cell
+            
+            if is_start and not is_listed:
+                self.starts.insert(index, cell)
+            elif is_listed and not is_start:
+                del self.starts[index]
+        
+        self.changed()
+    
+    def changed(self):
+        self.version += 1
+        self.cached_numbers = None
+    
+    def slots_at(self, position: Position) -> tuple[Slot | None, Slot | None]:
+        return self.cells[position]
+    
+    def slot_at(self, position: Position, direction: Direction) -> Slot | None:
+        return self.cells[position][0 if direction == Direction.ACROSS else 1]
+    
+    def all_slots(self) -> list[Slot]:
+        across = [slot for (direction, _), slots in self.lines.items() if direction == Direction.ACROSS for slot in slots]
+        down = [slot for (direction, _), slots in self.lines.items() if direction == Direction.DOWN for slot in slots]
+        return across + down
+    
+    @property
+    def numbers(self) -> dict[Position, int]:
+        if self.cached_numbers is None:
+            self.cached_numbers = {cell: number for number, cell in enumerate(self.starts, 1)}
+        return self.cached_numbers
+    
+    def number(self, slot: Slot) -> int:
+        return self.numbers[slot.cells[0]]
\ No newline at end of file
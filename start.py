@@ -1,19 +1,26 @@
+import time
+STARTED = time.perf_counter() # Time to first frame is measured from here, before anything heavy is imported
+
 import os, sys, pathlib
 
 DICTIONARIES_PATH = pathlib.Path(os.path.dirname(os.path.abspath(sys.argv[0])), "dictionaries")
-ALL_DICTIONARIES = {}
-with os.scandir(DICTIONARIES_PATH) as entries:
-    for entry in entries:
-        if not entry.is_file: continue
-        
-        with open(pathlib.Path(DICTIONARIES_PATH, entry.name)) as file:
-            ALL_DICTIONARIES[entry.name] = file.read().split("\n")
 
-no_gui = False
+no_gui = "--console" in sys.argv # Edit in the terminal, e.g. over SSH
 
-if no_gui:
-    from editor import CrosswordEditor
-    CrosswordEditor(ALL_DICTIONARIES).main_loop()
-else:
-    from gui.pygame_gui import PygameGUI
-    PygameGUI(ALL_DICTIONARIES).main_loop()
\ No newline at end of file
+if __name__ == "__main__":
+    # Every dictionary is compiled into one deduplicated store, memory mapped from dictionaries/.cache
+    # and rebuilt when any of them changes.
+    if no_gui:
+        from dictionary_cache import load_word_store
+        from console.console_editor import ConsoleEditor
+        ConsoleEditor(load_word_store(DICTIONARIES_PATH)).main_loop()
+    else:
+        # Loading starts before pygame is imported, and carries on behind the open window.
+        from dictionary_cache import load_in_background
+        ALL_DICTIONARIES = load_in_background(DICTIONARIES_PATH)
+        
+        from gui.pygame_gui import PygameGUI
+        if len(sys.argv) > 1:
+            PygameGUI(ALL_DICTIONARIES, pathlib.Path(sys.argv[1]), started = STARTED).main_loop()
+        else:
+            PygameGUI(ALL_DICTIONARIES, started = STARTED).main_loop()
\ No newline at end of file
@@ -0,0 +1,34 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from matrix import Matrix
+from gui.app_theme import AppTheme
+from gui.crossword_square import RenderedMatrix
+
+def render(rows: int, columns: int, screen_size: int) -> tuple[RenderedMatrix, pygame.Surface]:
+    pygame.init()
+    surface = pygame.Surface((screen_size, screen_size))
+    rendered = RenderedMatrix(Matrix(rows, columns), surface, AppTheme())
+    rendered.draw()
+    return rendered, surface
+
+def test_small_squares_are_outlined_not_filled():
+    # A 100x100 grid in 600 pixels is drawn at the minimum square size, under 30 pixels.
+    rendered, surface = render(100, 100, 600)
+    size = rendered.square_size()
+    assert size < 30
+    
+    theme = AppTheme()
+    for row, column in ((0, 0), (3, 7), (rendered.visible[0] - 1, rendered.visible[1] - 1)):
+        left, top = column * size, row * size
+        assert surface.get_at((left, top))[:3] == theme.cw_fill
+        assert surface.get_at((left + size // 4, top + size // 4))[:3] == theme.cw_background
+
+def test_filled_squares_are_solid():
+    rendered, surface = render(100, 100, 600)
+    rendered.matrix[0, 0].filled = True
+    rendered.draw()
+    size = rendered.square_size()
+    assert surface.get_at((size // 4, size // 4))[:3] == AppTheme().cw_fill
\ No newline at end of file
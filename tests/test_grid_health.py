@@ -0,0 +1,56 @@
+import random
+
+from matrix import Matrix
+from slots import SlotIndex
+from history import ToggleFill
+from grid_health import GridHealth, analyze
+
+def test_mirrored_toggles_match_analyze():
+    # As the editor's fill mode does: both squares flip, then are updated together.
+    generator = random.Random(0)
+    for _ in range(300):
+        size = generator.randint(3, 9)
+        matrix = Matrix(size, size)
+        slots = SlotIndex(matrix)
+        health = GridHealth(matrix, slots)
+        
+        for _ in range(generator.randint(1, 30)):
+            row, column = generator.randrange(size), generator.randrange(size)
+            positions = tuple({(row, column), (size - row - 1, size - column - 1)})
+            ToggleFill(positions).apply(matrix)
+            for position in positions:
+                slots.update(position)
+            health.update(*positions)
+        
+        assert health.report() == analyze(matrix)
+        labelled = [cell for region in health.regions.regions.values() for cell in region]
+        assert len(labelled) == len(set(labelled))
+
+def test_single_toggles_match_analyze():
+    generator = random.Random(1)
+    matrix = Matrix(7, 7)
+    slots = SlotIndex(matrix)
+    health = GridHealth(matrix, slots)
+    
+    for _ in range(200):
+        position = (generator.randrange(7), generator.randrange(7))
+        matrix[*position].filled = not matrix[*position].filled
+        slots.update(position)
+        health.update(position)
+        assert health.report() == analyze(matrix)
+
+def test_batched_toggles_match_analyze():
+    # A paste fills some squares and clears others in one command.
+    generator = random.Random(2)
+    for _ in range(200):
+        matrix = Matrix(8, 8)
+        slots = SlotIndex(matrix)
+        health = GridHealth(matrix, slots)
+        
+        for _ in range(10):
+            positions = tuple({(generator.randrange(8), generator.randrange(8)) for _ in range(generator.randint(1, 12))})
+            ToggleFill(positions).apply(matrix)
+            for position in positions:
+                slots.update(position)
+            health.update(*positions)
+            assert health.report() == analyze(matrix)
\ No newline at end of file
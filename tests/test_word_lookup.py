@@ -0,0 +1,38 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import time
+import pygame
+
+from gui.word_lookup import WordLookupWorker, WORDS_FOUND
+
+def wait_for_words(generation: int, timeout: float = 5) -> pygame.event.Event:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        for event in pygame.event.get(WORDS_FOUND):
+            if event.generation == generation:
+                return event
+        time.sleep(0.01)
+    raise AssertionError(f"No words posted for request {generation}")
+
+def test_worker_survives_a_failed_lookup():
+    pygame.display.init()
+    calls = []
+    
+    def find_words(pattern: str, replace_char: str) -> list[str]:
+        calls.append(pattern)
+        if len(calls) == 1:
+            raise RuntimeError("index not ready")
+        return [pattern.upper()]
+    
+    worker = WordLookupWorker(find_words)
+    try:
+        failed = wait_for_words(worker.submit("ab", ""))
+        assert failed.across is None and failed.down is None
+        assert isinstance(failed.error, RuntimeError)
+        
+        found = wait_for_words(worker.submit("cd", "ef"))
+        assert found.error is None
+        assert (found.across, found.down) == (["CD"], ["EF"])
+    finally:
+        worker.stop()
\ No newline at end of file
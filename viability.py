@@ -0,0 +1,95 @@
+from matrix import Matrix
+from slots import Slot, SlotIndex, Direction
+from word_filter import WordIndex, RankedMatches
+from autofill import WILDCARD, Variable, create_variables, is_empty
+
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+import math
+
+@dataclass
+class Crossing:
+    offset: int            # Letter of the entry at the shared square
+    slot: Slot
+    counts: dict[str, int] # Letter at the shared square to the completions left for the crossing entry
+
+@dataclass
+class CrossingQuery:
+    # An entry and the entries crossing its empty squares, copied out of the grid so they can be checked on another thread.
+    variables: list[Variable] # The entry first, then its crossings
+    
+    @property
+    def entry(self) -> Variable:
+        return self.variables[0]
+
+def crossing_query(matrix: Matrix, slots: SlotIndex, slot: Slot) -> CrossingQuery:
+    crossing_direction = 1 if slot.direction == Direction.ACROSS else 0
+    crossers = [slots.slots_at(cell)[crossing_direction] for cell in slot.cells if is_empty(matrix[*cell].character)]
+    return CrossingQuery(create_variables(matrix, [slot] + [crosser for crosser in crossers if crosser is not None]))
+
+class ViableMatches(RankedMatches):
+    # Candidates that leave every crossing entry at least one completion, best score first. With
+    # `by_viability` they are instead ordered by how many completions they leave, as autofill orders words.
+    def __init__(self, index: WordIndex, length: int, matches: set[int] | None, crossings: list[Crossing], by_viability: bool = False):
+        self.crossings = crossings
+        self.by_viability = by_viability
+        super().__init__(index, length, matches)
+    
+    def rank(self, ranking: Sequence[int] | None, matches: set[int] | None) -> Iterator[int]:
+        if not self.by_viability or not self.crossings:
+            return super().rank(ranking, matches)
+        
+        candidates = range(len(self.words)) if matches is None else matches
+        freedom = lambda index: sum(math.log(crossing.counts[self.words[index][crossing.offset]]) for crossing in self.crossings)
+        return iter(sorted(candidates, key = lambda index: (-freedom(index), -self.scores[index], index)))
+    
+    def remaining(self, word: str) -> int | None:
+        # Completions left for the most constrained crossing entry, or None if nothing crosses.
+        return min((crossing.counts.get(word[crossing.offset], 0) for crossing in self.crossings), default = None)
+
+class CrossingChecker:
+    # Forward checking for the word list: a crossing entry's completions are counted once per letter
+    # with posting intersections, then every candidate is pruned or ranked by a lookup per crossing.
+    # Typing only changes the crossings at the typed squares, so the counts of the others are cached.
+    def __init__(self, index: WordIndex, cache_size: int = 256):
+        self.index = index
+        self.cache: OrderedDict[tuple[str, int], dict[str, int]] = OrderedDict()
+        self.cache_size = cache_size
+    
+    def letter_counts(self, crosser: Variable, offset: int) -> dict[str, int]:
+        pattern = crosser.pattern()
+        key = (pattern, offset)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        
+        matches = self.index.matching_indices(pattern, WILDCARD)
+        counts = {}
+        for letter in self.index.letters(crosser.length, offset):
+            posting = self.index.posting(crosser.length, offset, letter)
+            count = len(posting) if matches is None else len(posting & matches)
+            if count:
+                counts[letter] = count
+        
+        self.cache[key] = counts
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+        return counts
+    
+    def crossings(self, query: CrossingQuery) -> list[Crossing]:
+        return [Crossing(offset, query.variables[other].slot, self.letter_counts(query.variables[other], other_offset))
+                for offset, other, other_offset in query.entry.crossings]
+    
+    def candidates(self, query: CrossingQuery, by_viability: bool = False) -> ViableMatches:
+        entry = query.entry
+        crossings = self.crossings(query)
+        matches = self.index.matching_indices(entry.pattern(), WILDCARD)
+        
+        # Candidates with a letter that leaves a crossing without completions are removed a posting at a time.
+        dead = [self.index.posting(entry.length, crossing.offset, letter)
+                for crossing in crossings for letter in self.index.letters(entry.length, crossing.offset) if letter not in crossing.counts]
+        if dead:
+            matches = (set(range(len(self.index.bucket(entry.length)))) if matches is None else matches).difference(*dead)
+        
+        return ViableMatches(self.index, entry.length, matches, crossings, by_viability)
\ No newline at end of file
@@ -1,17 +1,383 @@
-import regex as re
-from collections.abc import Callable
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from functools import cache
+import heapq, threading
 
-def create_filter(dictionaries: dict[str, list[str]]) -> Callable[[str, str], dict[str, list[str]]]:
-    def find_all_words(pattern: str, replace_char: str = "*") -> dict[str, list[str]]:
-        all_results = {}
+# Postings are keyed by (word length, position, letter) and hold indices into the length bucket.
+PostingKey = tuple[int, int, str]
+
+# A pattern with its wildcards replaced by None, so patterns using different wildcard characters share entries.
+PatternKey = tuple[str | None, ...]
+
+# Marks positions holding something a regex `\w` would not match, so wildcards can skip them.
+NON_WORD = ""
+
+# Given to words in lists without scores, and to lines without a `;score` suffix.
+DEFAULT_SCORE = 50
+
+@cache
+def is_word_character(character: str) -> bool:
+    import regex as re # Only needed when an index is built, so not imported at start up
+    return re.fullmatch(r"\w", character) is not None
+
+def parse_entry(line: str) -> tuple[str, int]:
+    # "WORD;50" is WORD with a score of 50. Lines without a numeric score get DEFAULT_SCORE.
+    word, separator, score = line.rpartition(";")
+    if separator and score.strip().lstrip("-").isdigit():
+        return word, int(score)
+    return line, DEFAULT_SCORE
+
+def parse_word_list(lines: Sequence[str]) -> tuple[list[str], list[int]]:
+    words, scores = [], []
+    for line in lines:
+        word, score = parse_entry(line)
+        words.append(word)
+        scores.append(score)
+    return words, scores
+
+class WordIndex:
+    def __init__(self, words: Sequence[str], scores: Sequence[int] | None = None):
+        self.buckets: dict[int, list[str]] = {}
+        self.postings: dict[PostingKey, set[int]] = {}
+        self.scores: dict[int, list[int]] = {}   # Per bucket, in bucket order
+        self.rankings: dict[int, list[int]] = {} # Per bucket, indices by descending score, built when first needed
+        self.letter_table: dict[tuple[int, int], list[str]] | None = None
         
-        for key in dictionaries:
-            matches = dictionaries[key]
-            matches = list(filter(lambda word: len(word) == len(pattern), matches))
-            matches = list(filter(lambda word: re.match(pattern.replace(replace_char, r"\w"), word), matches))
+        for word_id, word in enumerate(words):
+            bucket = self.buckets.setdefault(len(word), [])
             
-            all_results[key] = matches
+            for position, letter in enumerate(word):
+                self.postings.setdefault((len(word), position, letter), set()).add(len(bucket))
+                if not is_word_character(letter):
+                    self.postings.setdefault((len(word), position, NON_WORD), set()).add(len(bucket))
+            
+            bucket.append(word)
+            self.scores.setdefault(len(word), []).append(DEFAULT_SCORE if scores is None else scores[word_id])
+    
+    def bucket(self, length: int) -> Sequence[str]:
+        return self.buckets.get(length, [])
+    
+    def bucket_scores(self, length: int) -> Sequence[int]:
+        return self.scores.get(length, [])
+    
+    def ranking(self, length: int) -> Sequence[int]:
+        if length not in self.rankings:
+            scores = self.bucket_scores(length)
+            # Stable, so equal scores keep the dictionary's order.
+            self.rankings[length] = sorted(range(len(scores)), key = lambda index: -scores[index])
+        return self.rankings[length]
+    
+    def posting(self, length: int, position: int, letter: str) -> set[int]:
+        return self.postings.get((length, position, letter), set())
+    
+    def posting_keys(self) -> Iterable[PostingKey]:
+        return self.postings.keys()
+    
+    def letters(self, length: int, position: int) -> Sequence[str]:
+        # Every letter found at `position` in words of `length`.
+        if self.letter_table is None:
+            table = {}
+            for key_length, key_position, letter in self.posting_keys():
+                if letter != NON_WORD:
+                    table.setdefault((key_length, key_position), []).append(letter)
+            self.letter_table = table
+        return self.letter_table.get((length, position), [])
+    
+    def matching_indices(self, pattern: str, replace_char: str = "*") -> set[int] | None:
+        # Returns None when every word of the pattern's length matches.
+        length = len(pattern)
+        required = []
+        excluded = []
+        
+        for position, letter in enumerate(pattern):
+            if letter == replace_char:
+                excluded.append(self.posting(length, position, NON_WORD))
+            else:
+                required.append(self.posting(length, position, letter))
+        
+        excluded = [posting for posting in excluded if posting]
+        
+        if not required:
+            if not excluded:
+                return None
+            required.append(set(range(len(self.bucket(length)))))
+        
+        required.sort(key = len)
+        matches = required[0].intersection(*required[1:])
+        return matches.difference(*excluded) if excluded else matches
+    
+    def find_words(self, pattern: str, replace_char: str = "*") -> list[str]:
+        bucket = self.bucket(len(pattern))
+        matches = self.matching_indices(pattern, replace_char)
+        
+        if matches is None:
+            return list(bucket)
+        
+        return [bucket[index] for index in sorted(matches)]
+    
+    def ranked_words(self, pattern: str, replace_char: str = "*") -> "RankedMatches":
+        return RankedMatches(self, len(pattern), self.matching_indices(pattern, replace_char))
+
+class RankedMatches:
+    # Matches of one pattern, best score first. Only as many matches as have been asked for are
+    # ranked: broad patterns walk the pre-sorted bucket ranking, narrow ones pop from a heap.
+    def __init__(self, index: WordIndex, length: int, matches: set[int] | None):
+        self.words = index.bucket(length)
+        self.scores = index.bucket_scores(length)
+        self.count = len(self.words) if matches is None else len(matches)
+        self.order = self.rank(index.ranking(length) if matches is None or 8 * len(matches) >= len(self.words) else None, matches)
+        self.ranked: list[tuple[str, int]] = []
+        self.lock = threading.Lock() # Pages may be read from the lookup thread and the UI thread
+    
+    def rank(self, ranking: Sequence[int] | None, matches: set[int] | None) -> Iterator[int]:
+        if matches is None:
+            yield from ranking
+        elif ranking is not None:
+            yield from (index for index in ranking if index in matches)
+        else:
+            heap = [(-self.scores[index], index) for index in matches]
+            heapq.heapify(heap)
+            while heap:
+                yield heapq.heappop(heap)[1]
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def page(self, start: int, stop: int) -> list[tuple[str, int]]:
+        with self.lock:
+            if len(self.ranked) < stop:
+                for index in self.order:
+                    self.ranked.append((self.words[index], self.scores[index]))
+                    if len(self.ranked) >= stop:
+                        break
+            return self.ranked[start:stop]
+    
+    def top(self, count: int) -> list[tuple[str, int]]:
+        return self.page(0, count)
+
+def merge_dictionaries(dictionaries: dict[str, Sequence[str]], scores: dict[str, Sequence[int]] | None = None) -> tuple[list[str], list[int], list[int]]:
+    # Every distinct word in first-seen order, with its highest score and a bitmask of the dictionaries holding it.
+    ids: dict[str, int] = {}
+    words, word_scores, word_masks = [], [], []
+    for bit, (name, entries) in enumerate(dictionaries.items()):
+        source_scores = scores.get(name) if scores else None
+        for position, word in enumerate(entries):
+            score = DEFAULT_SCORE if source_scores is None else source_scores[position]
+            word_id = ids.setdefault(word, len(words))
+            if word_id == len(words):
+                words.append(word)
+                word_scores.append(score)
+                word_masks.append(1 << bit)
+            else:
+                word_masks[word_id] |= 1 << bit
+                word_scores[word_id] = max(word_scores[word_id], score)
+    
+    return words, word_scores, word_masks
+
+class WordStore(WordIndex):
+    # The words of several dictionaries, each stored and indexed once, with a bitmask of the
+    # dictionaries holding it. A word in several dictionaries keeps its highest score.
+    def __init__(self, dictionaries: dict[str, Sequence[str]], scores: dict[str, Sequence[int]] | None = None):
+        self.names = list(dictionaries)
+        words, word_scores, word_masks = merge_dictionaries(dictionaries, scores)
+        super().__init__(words, word_scores)
+        
+        self.masks: dict[int, list[int]] = {}
+        for word, mask in zip(words, word_masks):
+            self.masks.setdefault(len(word), []).append(mask)
+    
+    def bucket_masks(self, length: int) -> Sequence[int]:
+        return self.masks.get(length, [])
+    
+    def source_mask(self, names: Iterable[str]) -> int:
+        return sum(1 << self.names.index(name) for name in set(names))
+    
+    def sources(self, mask: int) -> list[str]:
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+    
+    def group(self, length: int, indices: Iterable[int]) -> dict[str, list[str]]:
+        bucket, masks = self.bucket(length), self.bucket_masks(length)
+        grouped = {name: [] for name in self.names}
+        lists = list(grouped.values())
+        
+        targets: dict[int, list[list[str]]] = {} # Mask to the result lists it appends to
+        for index in indices:
+            mask = masks[index]
+            if mask not in targets:
+                targets[mask] = [words for bit, words in enumerate(lists) if mask >> bit & 1]
+            for words in targets[mask]:
+                words.append(bucket[index])
+        
+        return grouped
+    
+    def find_grouped(self, pattern: str, replace_char: str = "*") -> dict[str, list[str]]:
+        # One query for every dictionary, with the matches then split by source.
+        matches = self.matching_indices(pattern, replace_char)
+        indices = range(len(self.bucket(len(pattern)))) if matches is None else sorted(matches)
+        return self.group(len(pattern), indices)
+    
+    def ranked_words(self, pattern: str, replace_char: str = "*", sources: int | None = None) -> RankedMatches:
+        # `sources` is a mask of the dictionaries to include, or None for all of them.
+        matches = self.matching_indices(pattern, replace_char)
+        if sources is not None and sources != (1 << len(self.names)) - 1:
+            masks = self.bucket_masks(len(pattern))
+            matches = {index for index in (range(len(masks)) if matches is None else matches) if masks[index] & sources}
+        return RankedMatches(self, len(pattern), matches)
+
+def pattern_key(pattern: str, replace_char: str) -> PatternKey:
+    return tuple(None if letter == replace_char else letter for letter in pattern)
+
+def refines(pattern: PatternKey, cached: PatternKey) -> bool:
+    # A pattern refines a cached one if it only fills in some of the cached pattern's wildcards.
+    if len(pattern) != len(cached):
+        return False
+    
+    return all(old is None or old == new for new, old in zip(pattern, cached))
+
+def refine(bucket: Sequence[str], indices: set[int] | None, pattern: PatternKey, cached: PatternKey) -> set[int]:
+    # Only the letters the cached pattern left as wildcards still need checking.
+    added = [(position, letter) for position, (letter, old) in enumerate(zip(pattern, cached)) if old is None and letter is not None]
+    return {index for index in (range(len(bucket)) if indices is None else indices) if all(bucket[index][position] == letter for position, letter in added)}
+
+@dataclass(eq = False)
+class CachedMatches:
+    # One pattern's matches as indices into its length bucket (None for all of them),
+    # and the views of them built so far.
+    length: int
+    indices: set[int] | None
+    size: int
+    grouped: dict[str, list[str]] | None = None
+    ranked: dict[int | None, RankedMatches] = field(default_factory = dict) # By source mask, keeping how far each was paged
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    refinements: int = 0 # Misses answered by filtering a cached, broader pattern
+    evictions: int = 0
+    entries: int = 0
+    words: int = 0
+
+class QueryCache:
+    def __init__(self, max_entries: int = 256, max_words: int = 2_000_000):
+        self.max_entries = max_entries
+        self.max_words = max_words  # Bounds memory by the number of cached matches
+        self.entries: OrderedDict[PatternKey, CachedMatches] = OrderedDict()
+        self.sizes: dict[PatternKey, int] = {}
+        self.stats = CacheStats()
+    
+    def get(self, key: PatternKey) -> CachedMatches | None:
+        results = self.entries.get(key)
+        if results is None:
+            return None
+        
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        return results
+    
+    def closest_refinement(self, key: PatternKey) -> PatternKey | None:
+        best = None
+        for cached in self.entries:
+            if refines(key, cached) and (best is None or self.sizes[cached] < self.sizes[best]):
+                best = cached
+        
+        if best is not None:
+            self.entries.move_to_end(best)
+        return best
+    
+    def put(self, key: PatternKey, matches: CachedMatches):
+        if matches.size > self.max_words:
+            return
+        
+        self.entries[key] = matches
+        self.sizes[key] = matches.size
+        self.stats.words += matches.size
+        
+        while len(self.entries) > self.max_entries or self.stats.words > self.max_words:
+            evicted, _ = self.entries.popitem(last = False)
+            self.stats.words -= self.sizes.pop(evicted)
+            self.stats.evictions += 1
         
-        return all_results
+        self.stats.entries = len(self.entries)
+    
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.stats.entries = self.stats.words = 0
+
+class WordFilter:
+    def __init__(self, dictionaries: dict[str, Sequence[str]] | WordStore, cache: QueryCache | None = None, store: type[WordStore] = WordStore):
+        # A store loaded from the compiled cache already carries its index. Otherwise `store` builds one,
+        # e.g. dawg.DawgStore for a smaller index.
+        self.store = dictionaries if isinstance(dictionaries, WordStore) else store(dictionaries)
+        self.cache = QueryCache() if cache is None else cache
+        # Parsed pattern_query queries, which cannot be refined from broader patterns, so are kept apart.
+        self.ranked_cache: OrderedDict[tuple["PatternQuery", int | None], "RankedMatches | MergedMatches"] = OrderedDict()
+        self.ranked_cache_size = 32
     
-    return find_all_words
\ No newline at end of file
+    def matches(self, pattern: str, replace_char: str = "*") -> CachedMatches:
+        # Both grouped and ranked lookups start here, so they share one cache.
+        key = pattern_key(pattern, replace_char)
+        
+        matches = self.cache.get(key)
+        if matches is not None:
+            return matches
+        
+        self.cache.stats.misses += 1
+        bucket = self.store.bucket(len(pattern))
+        
+        broader = self.cache.closest_refinement(key)
+        if broader is not None:
+            self.cache.stats.refinements += 1
+            indices = refine(bucket, self.cache.entries[broader].indices, key, broader)
+        else:
+            indices = self.store.matching_indices(pattern, replace_char)
+        
+        matches = CachedMatches(len(pattern), indices, len(bucket) if indices is None else len(indices))
+        self.cache.put(key, matches)
+        return matches
+    
+    def __call__(self, pattern: str, replace_char: str = "*") -> dict[str, list[str]]:
+        # The returned lists are shared with the cache and should not be modified.
+        matches = self.matches(pattern, replace_char)
+        if matches.grouped is None:
+            indices = range(len(self.store.bucket(matches.length))) if matches.indices is None else sorted(matches.indices)
+            matches.grouped = self.store.group(matches.length, indices)
+        return dict(matches.grouped)
+    
+    def ranked(self, pattern: str, replace_char: str = "*", sources: Iterable[str] | None = None) -> RankedMatches:
+        # Matches from every dictionary (or just `sources`) best score first, ranked lazily as pages are read.
+        mask = None if sources is None else self.store.source_mask(sources)
+        matches = self.matches(pattern, replace_char)
+        
+        if mask not in matches.ranked:
+            indices = matches.indices
+            if mask is not None and mask != (1 << len(self.store.names)) - 1:
+                masks = self.store.bucket_masks(matches.length)
+                indices = {index for index in (range(len(masks)) if indices is None else indices) if masks[index] & mask}
+            matches.ranked[mask] = RankedMatches(self.store, matches.length, indices)
+        return matches.ranked[mask]
+    
+    def top(self, pattern: str, count: int, replace_char: str = "*", sources: Iterable[str] | None = None) -> list[tuple[str, int]]:
+        return self.ranked(pattern, replace_char, sources).top(count)
+    
+    def search(self, query: "str | PatternQuery", wildcard: str = "?", sources: Iterable[str] | None = None) -> "RankedMatches | MergedMatches":
+        # Like `ranked`, for a pattern_query pattern with letter classes, exclusions, rebus squares and required letters.
+        from pattern_query import parse_query, ranked_query
+        query = parse_query(query, wildcard) if isinstance(query, str) else query
+        mask = None if sources is None else self.store.source_mask(sources)
+        key = (query, mask)
+        
+        if key in self.ranked_cache:
+            self.ranked_cache.move_to_end(key)
+            return self.ranked_cache[key]
+        
+        results = ranked_query(self.store, query, mask)
+        self.ranked_cache[key] = results
+        if len(self.ranked_cache) > self.ranked_cache_size:
+            self.ranked_cache.popitem(last = False)
+        return results
+
+def create_filter(dictionaries: dict[str, Sequence[str]] | WordStore, store: type[WordStore] = WordStore) -> WordFilter:
+    return WordFilter(dictionaries, store = store)
\ No newline at end of file